@@ -22,10 +22,12 @@ async def setup(bot):
 
     # Karma cog stuff
     cog = Karma(bot, args)
+    await cog.initialize()
     bot.add_cog(cog)
 
     # Courses cog stuff
     cog = Courses(bot, args)
+    await cog.initialize()
     bot.add_cog(cog)
 
     # CSS cog stuff
@@ -0,0 +1,21 @@
+def member_group(config, guild_id: int):
+    """
+    Returns the Config group holding every member record of a guild.
+
+    Config only has public ways to read and write one member at a time, so this
+    is the one place that uses its private group lookup for whole-guild access.
+    """
+    return config._get_base_group(config.MEMBER, str(guild_id))
+
+
+async def update_members(config, guild_id: int, updates: dict):
+    """
+    Merges member id -> {key: value} into the guild's member records in a single write.
+    """
+    if not updates:
+        return
+    group = member_group(config, guild_id)
+    data = await group()
+    for member_id, values in updates.items():
+        data.setdefault(str(member_id), {}).update(values)
+    await group.set(data)
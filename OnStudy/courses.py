@@ -1,11 +1,16 @@
 from redbot.core import commands, Config, checks
-from redbot.core.utils.chat_formatting import error
+from redbot.core.utils.chat_formatting import box, error, humanize_list, pagify
 from redbot.core.utils.predicates import MessagePredicate
 from .logger import logger
+from .throttle import TokenBucket, run_bounded
 
+import asyncio
+import contextlib
 import discord
+import fnmatch
 import re
 import random
+import time
 
 
 class Courses(commands.Cog):
@@ -24,6 +29,12 @@ class Courses(commands.Cog):
       }
     ]
 
+    # how many courses are provisioned at once by `courses create`
+    provision_workers = 4
+
+    # how many course list entries `courses sync` processes between checkpoints
+    sync_checkpoint_interval = 10
+
     def __init__(self, bot, args):
         """
         Initialize the CourseAssignment object
@@ -45,11 +56,39 @@ class Courses(commands.Cog):
         # )
 
         default_guild = {
-            "registered_courses": {}
+            "registered_courses": {},
+            "course_directory": {},
+            "sync_checkpoint": {}
         }
 
         self.db.register_guild(**default_guild)
 
+        # message id -> role id for every registered course entry in #course-list
+        self.course_index = {}
+
+        # request budgets for the Discord routes used when building courses
+        self.buckets = {
+            "roles": TokenBucket(5, 1.0),
+            "channels": TokenBucket(5, 1.0),
+            "messages": TokenBucket(5, 5.0),
+            "reactions": TokenBucket(1, 0.25)
+        }
+
+    async def initialize(self):
+        """
+        Loads the registered courses into the in-memory course index
+        """
+        guild_data = await self.db.all_guilds()
+        courses = guild_data.get(self.guild_id, {}).get("registered_courses", {})
+        self.course_index = {
+            int(msg_id): course["role_id"] for msg_id, course in courses.items()
+        }
+        logger.info(f"Loaded {len(self.course_index)} courses into the course index.")
+
+    def cog_unload(self):
+        # the role handler isn't a loaded cog itself, so it is unloaded with the cog that uses it
+        self.roles.cog_unload()
+
     # Helper methods
     async def getStaffRole(self):
         """
@@ -101,17 +140,130 @@ class Courses(commands.Cog):
         if roles is None:
             return await ctx.send(error("Role cannot be blank"))
 
-        roles = roles.split(" ")
-
-        # regisiter the course with the database
-        for role in roles:
-            await self._courses_register(ctx, role.lower(), sort=False)
+        names = []
+        for role in roles.split(" "):
+            role = role.lower()
+            if role and role not in names:
+                names.append(role)
+
+        # build the course list directory once up front rather than per course
+        if not await self.db.guild(ctx.guild).course_directory():
+            await self._courses_refresh_directory(ctx.guild)
+
+        # ask about all of the missing roles at once instead of once per course
+        missing = [name for name in names if await self._courses_does_course_exist(name) is None]
+        if missing:
+            create_missing = await self.logic.confirm(ctx, msg=(
+                f"The roles {humanize_list([f'`{name}`' for name in missing])} do not exist. "
+                "Would you like to create them?"
+            ))
+            if not create_missing:
+                names = [name for name in names if name not in missing]
+                await ctx.send(f"Skipping {humanize_list(missing)}.")
+
+        # regisiter the courses with the database
+        results = await self._courses_provision(ctx, names)
 
         # sort courses after all courses have been added
         await ctx.invoke(self._courses_sort)
 
+        for page in pagify(self._courses_results_table(results), page_length=1900):
+            await ctx.send(box(page))
+
         await ctx.channel.send("Done.")
-        pass        
+
+    async def _courses_provision(self, ctx, names):
+        """
+        Builds the role, channels and course list entry for each course in `names`.
+
+        Roles and channels for several courses are created at once by a bounded pool
+        of workers which share the per-route request budgets. Course list entries are
+        posted afterwards one at a time so that they keep the requested order.
+        Returns a result row for each course.
+        """
+        results = [
+            {"course": name, "role": "-", "category": "-", "entry": "-", "status": "failed"}
+            for name in names
+        ]
+        provisioned = {}
+        progress = {"done": 0, "edited": 0.0}
+        status = await ctx.send(f"Provisioned 0 of {len(names)} courses.")
+
+        async def report_progress():
+            progress["done"] += 1
+            now = time.monotonic()
+            # keep the status edits from competing with the actual work
+            if progress["done"] < len(names) and now - progress["edited"] < 2:
+                return
+            progress["edited"] = now
+            try:
+                await status.edit(content=f"Provisioned {progress['done']} of {len(names)} courses.")
+            except discord.HTTPException:
+                logger.exception("Editing provisioning status message failed.")
+
+        def build_job(result):
+            async def provision():
+                name = result["course"]
+                try:
+                    role = await self._courses_does_course_exist(name)
+                    if role is None:
+                        async with self.buckets["roles"]:
+                            role = await self.roles.make_role(ctx.guild, name)
+                        if role is None:
+                            result["status"] = "failed: role"
+                            return
+                        result["role"] = "created"
+                    else:
+                        result["role"] = "existing"
+
+                    category = await self._course_create_channel(ctx, role)
+                    result["category"] = category.name
+                    provisioned[name] = (role, category)
+                except discord.HTTPException as e:
+                    logger.exception(f"Provisioning {name} failed.")
+                    result["status"] = f"failed: {e.status}"
+                finally:
+                    await report_progress()
+            return provision
+
+        async with ctx.typing(), self._courses_registration_batch(ctx.guild) as batch:
+            outcomes = await run_bounded([build_job(result) for result in results], workers=self.provision_workers)
+            for result, outcome in zip(results, outcomes):
+                # anything other than a Discord error gets past the job's own handling
+                if isinstance(outcome, Exception):
+                    logger.error(f"Provisioning {result['course']} failed.", exc_info=outcome)
+                    result["status"] = f"failed: {type(outcome).__name__}"
+
+            for result in results:
+                if result["course"] not in provisioned:
+                    continue
+                role, category = provisioned[result["course"]]
+                try:
+                    message_id = await self._courses_create_courseList_entry(ctx, role)
+                    await self._courses_save_record(
+                        ctx.guild, message_id, self._courses_create_record(role, category), batch=batch
+                    )
+                except discord.HTTPException as e:
+                    logger.exception(f"Creating the course list entry for {role.name} failed.")
+                    result["status"] = f"failed: {e.status}"
+                else:
+                    result["entry"] = str(message_id)
+                    result["status"] = "ok"
+
+        return results
+
+    def _courses_results_table(self, results):
+        """
+        Formats the provisioning results as a plain text table
+        """
+        columns = ("course", "role", "category", "entry", "status")
+        rows = [tuple(column.title() for column in columns)]
+        rows += [tuple(str(result[column]) for column in columns) for result in results]
+        widths = [max(len(row[i]) for row in rows) for i in range(len(columns))]
+        return "\n".join(
+            "  ".join(cell.ljust(width) for cell, width in zip(row, widths)).rstrip()
+            for row in rows
+        )
 
     async def _course_create_channel(self, ctx, course_role, *, sections_num: int = 0):
         """
@@ -133,11 +285,14 @@ class Courses(commands.Cog):
         }
 
         # create the category
+        await self.buckets["channels"].acquire()
         course_category = await self.bot.get_guild(self.guild_id).create_category(name=f"{course_role.name.upper()}", overwrites=overwrites)
         # create the general chat for the course
+        await self.buckets["channels"].acquire()
         await self.bot.get_guild(self.guild_id).create_text_channel(name=course_role.name, category=course_category)
         # create any requested section channels
         for i in range(1, sections_num):
+            await self.buckets["channels"].acquire()
             await self.bot.get_guild(self.guild_id).create_text_channel(name=f"section-00{i}", category=course_category)
         # create the voice channels
         voice_channel_name = re.sub(
@@ -146,7 +301,9 @@ class Courses(commands.Cog):
             course_role.name
         )
 
+        await self.buckets["channels"].acquire()
         await self.bot.get_guild(self.guild_id).create_voice_channel(name=f"{voice_channel_name}-gen", category=course_category)
+        await self.buckets["channels"].acquire()
         await self.bot.get_guild(self.guild_id).create_voice_channel(name=f"{voice_channel_name}-school", category=course_category)
 
         return course_category
@@ -175,13 +332,16 @@ class Courses(commands.Cog):
         """
 
         # check to make sure that the course isn't already in the course list
-        async for message in self.channels.courseList.history():
-            if message.content == course_role.name:
-                logger.warning(f"Skipping creation course list entry for {course_role.name} as it already exists.")
-                return message.id
+        directory = await self.db.guild(ctx.guild).course_directory()
+        message_id = directory.get(course_role.name)
+        if message_id is not None:
+            logger.warning(f"Skipping creation course list entry for {course_role.name} as it already exists.")
+            return message_id
 
         # create the course role message
-        message = await self.channels.courseList.send(f"{course_role.name}")
+        async with self.buckets["messages"]:
+            message = await self.channels.courseList.send(f"{course_role.name}")
+        await self.db.guild(ctx.guild).course_directory.set_raw(course_role.name, value=message.id)
         await self.add_reaction_to_message(ctx, message, self.emoji)
 
         logger.info(f"Created course list entry for {course_role.name}")
@@ -199,13 +359,102 @@ class Courses(commands.Cog):
         if not confirm:
             return await ctx.send("Canceling.")
 
+        course = (await self.db.guild(ctx.guild).registered_courses()).get(str(msg_id))
+        if course is None:
+            return await ctx.send(error(f"No course is registered to message {msg_id}."))
+
+        # same as bulk delete, a course is only unregistered once it is completely gone
+        try:
+            await self._courses_teardown(msg_id, course)
+        except Exception:
+            logger.exception(f"Deleting course {course['course_name']} failed.")
+            return await ctx.send(error(f"Could not fully delete {course['course_name']}. It is still registered."))
+
         async with self.db.guild(ctx.guild).registered_courses() as courses:
-            course = courses.pop(str(msg_id), None)
-            await self.remove_course_channel(course["category_id"])
-            await self.remove_course_role(course["role_id"])
-            await self.remove_courseList_entry(msg_id)
+            courses.pop(str(msg_id), None)
+            self.course_index.pop(msg_id, None)
+        await self._courses_forget_entries(ctx.guild, [msg_id])
         await ctx.channel.send("Done.")
-        
+
+    @_courses.command(name="bulk_delete", aliases=["bdel"])
+    async def _courses_bulk_delete(self, ctx, *targets: str):
+        """
+        Removes many courses at once. **NO UNDO!**
+
+        targets: course list message ids and/or course name patterns, ex. `cs2* 514520000000000000`
+        """
+        if not targets:
+            return await ctx.send(error("Supply at least one course id or name pattern."))
+
+        courses = await self.db.guild(ctx.guild).registered_courses()
+
+        # resolve every target against the registered courses
+        selected = {}
+        for target in targets:
+            if target.isdigit():
+                if target in courses:
+                    selected[target] = courses[target]
+                continue
+            for msg_id, course in courses.items():
+                if fnmatch.fnmatch(course["course_name"].lower(), target.lower()):
+                    selected[msg_id] = course
+
+        if not selected:
+            return await ctx.send("No registered courses matched.")
+
+        names = sorted(course["course_name"] for course in selected.values())
+        shown = humanize_list(names[:30]) + (f" and {len(names) - 30} more" if len(names) > 30 else "")
+        confirm = await self.logic.confirm(ctx, msg=(
+            f"Are you sure you wish to delete {len(names)} course{'s' if len(names) != 1 else ''}: {shown}? There is no undo."
+        ))
+        if not confirm:
+            return await ctx.send("Canceling.")
+
+        def build_job(msg_id, course):
+            async def teardown():
+                await self._courses_teardown(int(msg_id), course)
+            return teardown
+
+        async with ctx.channel.typing():
+            results = await run_bounded(
+                [build_job(msg_id, course) for msg_id, course in selected.items()],
+                workers=self.provision_workers
+            )
+
+            deleted = []
+            failed = []
+            for (msg_id, course), result in zip(selected.items(), results):
+                if isinstance(result, Exception):
+                    logger.error(f"Deleting course {course['course_name']} failed.", exc_info=result)
+                    failed.append(course["course_name"])
+                else:
+                    deleted.append(int(msg_id))
+
+            # one write for all of the removed courses
+            async with self.db.guild(ctx.guild).registered_courses() as registered:
+                for msg_id in deleted:
+                    registered.pop(str(msg_id), None)
+                    self.course_index.pop(msg_id, None)
+            await self._courses_forget_entries(ctx.guild, deleted)
+
+        if failed:
+            await ctx.send(error(f"Could not fully delete: {humanize_list(failed)}. They are still registered."))
+        await ctx.send(f"Deleted {len(deleted)} course{'s' if len(deleted) != 1 else ''}.")
+
+    async def _courses_teardown(self, msg_id, course):
+        """
+        Removes the channels, role and course list entry of a course at the same time.
+        Raises the first error encountered, if any.
+        """
+        results = await asyncio.gather(
+            self.remove_course_channel(course["category_id"]),
+            self.remove_course_role(course["role_id"]),
+            self.remove_courseList_entry(msg_id),
+            return_exceptions=True
+        )
+        for result in results:
+            if isinstance(result, Exception):
+                raise result
 
     async def remove_course_channel(self, category_id):
         """
@@ -215,10 +464,19 @@ class Courses(commands.Cog):
         if category is None:
             return logger.error("category is empty.")
 
-        for channel in category.channels:
-            await channel.delete(reason=f"removing parent category")
+        def build_job(channel):
+            async def delete():
+                async with self.buckets["channels"]:
+                    await channel.delete(reason=f"removing parent category")
+            return delete
 
-        await category.delete()
+        results = await run_bounded([build_job(channel) for channel in category.channels], workers=self.provision_workers)
+        for result in results:
+            if isinstance(result, Exception):
+                raise result
+
+        async with self.buckets["channels"]:
+            await category.delete()
         
 
     async def remove_course_role(self, role_id):
@@ -229,18 +487,59 @@ class Courses(commands.Cog):
         if role is None:
             return logger.error("role is empty.")
 
-        await role.delete()
+        async with self.buckets["roles"]:
+            await role.delete()
         
 
     async def remove_courseList_entry(self, msg_id):
         """
         Removes the course list entry that matches the 'msg_id' from the courseList channel.
         """
-        msg = await self.channels.courseList.get_message(msg_id)
-        if msg is None:
-            return logger.error("msg is empty")
+        try:
+            msg = await self.channels.courseList.get_message(msg_id)
+        except discord.NotFound:
+            # already deleted by hand, which is what we wanted anyway
+            return logger.info(f"Course list entry {msg_id} is already gone.")
+
+        async with self.buckets["messages"]:
+            with contextlib.suppress(discord.NotFound):
+                await msg.delete()
 
-        await msg.delete()
+    async def _courses_forget_entries(self, guild, msg_ids):
+        """
+        Drops the course list entries in 'msg_ids' from the course list directory in one write.
+        """
+        msg_ids = set(msg_ids)
+        if not msg_ids:
+            return
+        async with self.db.guild(guild).course_directory() as directory:
+            for name in [name for name, entry_id in directory.items() if entry_id in msg_ids]:
+                del directory[name]
+
+    async def _courses_refresh_directory(self, guild):
+        """
+        Rebuilds the course name -> message id directory with a single scan of the courseList channel.
+        """
+        directory = {}
+        # history is newest first, so the most recent entry for a name wins
+        async for message in self.channels.courseList.history(limit=None):
+            if message.content:
+                directory.setdefault(message.content, message.id)
+
+        await self.db.guild(guild).course_directory.set(directory)
+        logger.info(f"Course list directory rebuilt with {len(directory)} entries.")
+        return directory
+
+    @_courses.command(name="refresh")
+    async def _courses_refresh(self, ctx):
+        """
+        Rebuilds the course list directory from the history of #course-list.
+
+        Only needed if entries were posted or deleted by hand.
+        """
+        async with ctx.channel.typing():
+            directory = await self._courses_refresh_directory(ctx.guild)
+        await ctx.send(f"Found {len(directory)} course list entries.")
         
 
     async def _courses_does_course_exist(self, course_role_name: str):
@@ -255,17 +554,18 @@ class Courses(commands.Cog):
                 break
         return course_role_found
 
-    async def _courses_register_from_courseListing(self, ctx, message: discord.Message, create_interaction: bool = False):
+    async def _courses_register_from_courseListing(self, ctx, message: discord.Message, create_interaction: bool = False, batch: dict = None):
         """
         Registers a course from a course listing in the courseList channel.
         """
-        await self._courses_register(ctx, message.content, create_interaction=create_interaction, message_id=message.id)
+        await self._courses_register(ctx, message.content, create_interaction=create_interaction, message_id=message.id, batch=batch)
 
-    async def _courses_register(self, ctx, role_name: str, *, sections_num: int = 0, create_interaction: bool = True, message_id: int = 0, sort: bool = False):
+    async def _courses_register(self, ctx, role_name: str, *, sections_num: int = 0, create_interaction: bool = True, message_id: int = 0, sort: bool = False, batch: dict = None):
         """
         Registers a course.
         msg_id: the id of the message which will trigger the course to be applied.
         course: a dict object in format of {"course_name": str, "role_id": int}
+        batch: if supplied, the record is collected there instead of being written right away.
         """
 
         # get the role from the list of server roles
@@ -295,43 +595,101 @@ class Courses(commands.Cog):
             course_channel
         )
 
-        async with self.db.guild(ctx.guild).registered_courses() as courses:
-            courses.update({
-                str(message_id): course_record
-            })
+        await self._courses_save_record(ctx.guild, message_id, course_record, batch=batch)
 
         if sort:
             await ctx.invoke(self._courses_sort)
 
         
 
+    async def _courses_save_record(self, guild, message_id, course_record, *, batch: dict = None):
+        """
+        Stores a course record and adds it to the course index
+
+        If a registration batch is supplied the record is only collected in it,
+        to be written along with the rest of the batch.
+        """
+        self.course_index[int(message_id)] = course_record["role_id"]
+        if batch is not None:
+            batch[str(message_id)] = course_record
+            return
+
+        await self._courses_commit_records(guild, {str(message_id): course_record})
+
+    async def _courses_commit_records(self, guild, records: dict):
+        """
+        Writes the collected course records to registered_courses in one write and empties 'records'.
+        """
+        if not records:
+            return
+        async with self.db.guild(guild).registered_courses() as courses:
+            courses.update(records)
+        records.clear()
+
+    @contextlib.asynccontextmanager
+    async def _courses_registration_batch(self, guild):
+        """
+        Collects course records registered inside the block and writes them all at once on the way out.
+
+        The write also happens when the block fails part way, so courses whose
+        roles and channels were already built stay registered.
+        """
+        batch = {}
+        try:
+            yield batch
+        finally:
+            await self._courses_commit_records(guild, batch)
+
     @_courses.command(name="remove_member", aliases=["rm"])
     async def _courses_remove_member(self, ctx, member: discord.Member):
         """
         Removes a member's reactions for the courses in course list.
+
+        Only the entries for courses the member is enrolled in are touched.
         """
+        # course list entry for each course role, from the course index
+        entries = {role_id: message_id for message_id, role_id in self.course_index.items()}
+        roles = [role for role in member.roles if role.id in entries]
+        if not roles:
+            return await ctx.send(f"**{member.display_name}** isn't enrolled in any courses.")
+
+        def build_job(message_id):
+            async def remove_reaction():
+                # straight to the route, fetching the message first would cost a second request
+                async with self.buckets["reactions"]:
+                    await self.bot.http.remove_reaction(
+                        channel_id=self.channels.courseList.id, message_id=message_id,
+                        emoji=self.emoji, member_id=member.id
+                    )
+            return remove_reaction
+
         async with ctx.channel.typing():
+            await ctx.send(f"Removing member from {len(roles)} course{'s' if len(roles) != 1 else ''}.")
+            results = await run_bounded(
+                [build_job(entries[role.id]) for role in roles], workers=self.provision_workers
+            )
+            for role, result in zip(roles, results):
+                if isinstance(result, discord.NotFound):
+                    logger.error(f"The course list entry or reaction for {role.name} was not found.")
+                elif isinstance(result, discord.Forbidden):
+                    logger.error("Insufficient permissions to remove reaction.", exc_info=result)
+                elif isinstance(result, Exception):
+                    logger.error(f"Removing the reaction for {role.name} failed.", exc_info=result)
+
             try:
-                await ctx.send("Removing member from courses.")
-                async for message in self.channels.courseList.history():
-                    await message.remove_reaction(self.emoji, member)
-                await ctx.send("Done.")
+                await member.remove_roles(*roles, reason=f"{ctx.author} removed the member from their courses.")
             except discord.Forbidden:
-                logger.exception("Insufficient permissions to remove reaction.")
-            except discord.NotFound:
-                logger.exception("The member or emoji you specified was not found.")
-            except discord.InvalidArgument:
-                logger.exception("The emoji parameter is invalid.")
+                logger.exception("Insufficient permissions to remove roles.")
             except discord.HTTPException:
-                logger.exception("Removing the reaction failed.")
-        
+                logger.exception("Removing the roles failed.")
+            await ctx.send("Done.")
 
     @_courses.command(name="reset")
     async def _courses_reset(self, ctx):
         """
         Clears all registered courses. **NO UNDO**!
         """
-        pred = await self.logic.confirm("Are you sure you wish to clear all registered courses? There is **no undo option**.")
+        pred = await self.logic.confirm(ctx, msg="Are you sure you wish to clear all registered courses? There is **no undo option**.")
         if pred is False:
             return await ctx.channel.send("Canceling.")
 
@@ -339,6 +697,7 @@ class Courses(commands.Cog):
             await ctx.channel.send("Clearing registered courses.")
             async with self.db.guild(ctx.guild).registered_courses() as courses:
                 courses.clear()
+            self.course_index.clear()
         await ctx.channel.send("Done.")
         
 
@@ -376,21 +735,36 @@ class Courses(commands.Cog):
 
         start_index = 5
 
-        category_list = self.bot.get_guild(self.guild_id).categories[start_index:]
+        guild = self.bot.get_guild(self.guild_id)
+        categories = guild.categories
+        category_list = categories[start_index:]
 
         def take_name(elem):
             return elem.name.upper()
 
-        category_list.sort(key=take_name)
+        sorted_list = sorted(category_list, key=take_name)
+
+        if [category.id for category in category_list] == [category.id for category in sorted_list]:
+            # positions can have gaps, so an already sorted guild would otherwise still be sent
+            payload = []
+        else:
+            # course categories start right after the last fixed category
+            base = categories[start_index - 1].position + 1 if 0 < start_index <= len(categories) else 0
+            # only categories that aren't already at their sorted position are sent
+            payload = [
+                {"id": category.id, "position": base + index}
+                for index, category in enumerate(sorted_list)
+                if category.position != base + index
+            ]
+        moves = len(payload)
 
         async with ctx.typing():
-            for index, category in enumerate(category_list):
-                new_position = index + start_index
+            for category in category_list:
+                if category.name == category.name.upper():
+                    continue
                 try:
-                    await category.edit(name=category.name.upper(), position=new_position)
-                except discord.InvalidArgument:
-                    logger.exception(f"Invalid attempt to change the position of category {category.name} to position {new_position}")
-                    await ctx.send(error(f"Invalid attempt to change the position of category {category.name} to position {new_position}"))
+                    async with self.buckets["channels"]:
+                        await category.edit(name=category.name.upper())
                 except discord.Forbidden:
                     logger.exception(f"Forbidden from modifying category {category.name}")
                     await ctx.send(error(f"Forbidden from modifying category {category.name}"))
@@ -398,49 +772,186 @@ class Courses(commands.Cog):
                     logger.exception(f"Failed to edit category {category.name}")
                     await ctx.send(error(f"Failed to edit category {category.name}"))
 
-        await ctx.send("Done Sorting.")
+            if payload:
+                try:
+                    async with self.buckets["channels"]:
+                        await self.bot.http.bulk_channel_update(guild.id, payload, reason="Sorting course categories")
+                except discord.Forbidden:
+                    logger.exception("Forbidden from moving course categories")
+                    await ctx.send(error("Forbidden from moving course categories"))
+                except discord.HTTPException:
+                    logger.exception("Failed to move course categories")
+                    await ctx.send(error("Failed to move course categories"))
 
+        await ctx.send(f"Done Sorting. Moved {moves} categor{'y' if moves == 1 else 'ies'}.")
         
 
     @_courses.command(name="sync")
-    async def _courses_sync(self, ctx):
+    async def _courses_sync(self, ctx, prune: bool = False, dry_run: bool = False):
         """
         Syncs the course list channel with the bot and the users.
 
+        Only members whose reaction and course role disagree are changed.
+        prune: also remove the course role from members who haven't reacted.
+        dry_run: list the changes that would be made without making them.
+
+        Progress is checkpointed, so an interrupted sync picks up where it
+        left off the next time it is run. Use `courses sync_reset` to start over.
+
         **Warning:** May take some time to complete.
         """
-        async with ctx.channel.typing():
+        guild = self.bot.get_guild(self.guild_id)
+        planned = []
+
+        # dry runs always look at the whole list and never touch the checkpoint
+        checkpoint = {} if dry_run else await self.db.guild(guild).sync_checkpoint()
+        counters = {
+            "processed": checkpoint.get("processed", 0),
+            "added": checkpoint.get("added", 0),
+            "removed": checkpoint.get("removed", 0)
+        }
+        last_message_id = checkpoint.get("last_message_id")
+
+        if last_message_id is None:
+            status = await ctx.send("Syncing courses. This may take a while. Please be patient.")
+            # every course list entry is newer than the channel itself
+            after = discord.Object(id=self.channels.courseList.id)
+        else:
+            status = await ctx.send(f"Resuming course sync after {counters['processed']} entries.")
+            after = discord.Object(id=last_message_id)
+
+        async def save_checkpoint():
+            # registrations have to be on disk before the checkpoint moves past them
+            await self._courses_commit_records(guild, batch)
+            if not dry_run and last_message_id is not None:
+                await self.db.guild(guild).sync_checkpoint.set({"last_message_id": last_message_id, **counters})
+
+        async def report_progress(msg):
+            try:
+                await status.edit(content=msg)
+            except discord.HTTPException:
+                logger.exception("Editing sync status message failed.")
+
+        async with ctx.channel.typing(), self._courses_registration_batch(guild) as batch:
             try:
-                await ctx.send("Syncing courses. This may take a while. Please be patient.")
-                async for message in self.channels.courseList.history():
+                # who holds each role, gathered once rather than once per course
+                holders = {}
+                for member in guild.members:
+                    for role in member.roles:
+                        holders.setdefault(role.id, set()).add(member.id)
+
+                # oldest first, so the last processed message id marks how far we got
+                async for message in self.channels.courseList.history(limit=None, after=after):
                     # syncs courses with the bot's database
-                    await self._courses_register_from_courseListing(ctx, message, create_interaction=False)
+                    if message.id not in self.course_index and not dry_run:
+                        await self._courses_register_from_courseListing(ctx, message, create_interaction=False, batch=batch)
 
                     # syncs users with the courses they have signed up for
-                    await self._courses_sync_roles(ctx, message)
-                await ctx.send("Done.")
+                    to_add, to_remove = await self._courses_sync_roles(
+                        ctx, message, holders, prune=prune, dry_run=dry_run
+                    )
+                    if to_add or to_remove:
+                        planned.append((message.content, to_add, to_remove))
+
+                    last_message_id = message.id
+                    counters["processed"] += 1
+                    counters["added"] += len(to_add)
+                    counters["removed"] += len(to_remove)
+
+                    if counters["processed"] % self.sync_checkpoint_interval == 0:
+                        await save_checkpoint()
+                        await report_progress(
+                            f"Synced {counters['processed']} courses "
+                            f"(added {counters['added']}, removed {counters['removed']}). Latest: {message.content}"
+                        )
             except discord.Forbidden:
                 logger.exception("discord.Forbidden error.")
+                await save_checkpoint()
+                return await ctx.send(error("Sync stopped: missing permissions. Run it again to resume."))
             except discord.HTTPException:
                 logger.exception("discord.HTTPException error.")
-        
+                await save_checkpoint()
+                return await ctx.send(error("Sync was interrupted. Run it again to resume."))
+
+        if dry_run:
+            lines = [
+                f"{course}: "
+                + "; ".join(part for part in (
+                    f"add {humanize_list([member.display_name for member in to_add])}" if to_add else "",
+                    f"remove {humanize_list([member.display_name for member in to_remove])}" if to_remove else ""
+                ) if part)
+                for course, to_add, to_remove in planned
+            ]
+            for page in pagify("\n".join(lines) or "Nothing to change.", page_length=1900):
+                await ctx.send(box(page))
+            return await report_progress(
+                f"Dry run: would add {counters['added']} and remove {counters['removed']} course roles."
+            )
+
+        await self.db.guild(guild).sync_checkpoint.clear()
+        await report_progress(
+            f"Synced {counters['processed']} courses. "
+            f"Added {counters['added']} and removed {counters['removed']} course roles."
+        )
+        await ctx.send("Done.")
+
+    @_courses.command(name="sync_reset")
+    async def _courses_sync_reset(self, ctx):
+        """
+        Discards the saved progress of an interrupted sync so the next sync starts over.
+        """
+        await self.db.guild(ctx.guild).sync_checkpoint.clear()
+        await ctx.send("Done.")
 
-    async def _courses_sync_roles(self, ctx, message: discord.Message):
+    async def _courses_sync_roles(self, ctx, message: discord.Message, holders: dict, *, prune: bool = False, dry_run: bool = False):
         """
         Updates users and courses in #course-list to make sure they match
+
+        Compares the members who reacted to the course entry against the members
+        holding the course role and only acts on the difference.
+        Returns the members the role was (or would be) added to and removed from.
         """
+        guild = self.bot.get_guild(self.guild_id)
+        role = guild.get_role(self.course_index.get(message.id, 0))
+        if role is None:
+            logger.error(f"No course role found for course list entry {message.id}.")
+            return [], []
+
+        reactors = set()
+        has_bot_reacted = False
         for react in message.reactions:
-            if str(react.emoji) == self.emoji:
-                has_bot_reacted = False
-                async for user in react.users():
-                    if user.bot and user == self.bot.get_guild(self.guild_id).me:
-                        has_bot_reacted = True
-                        continue
-                    await self.process_course_assignment_from_call(react, user)
-
-                if not has_bot_reacted:
-                    await self.add_reaction_to_message(ctx, message, self.emoji)
-        
+            if str(react.emoji) != self.emoji:
+                continue
+            async for user in react.users():
+                if user == guild.me:
+                    has_bot_reacted = True
+                elif not user.bot:
+                    reactors.add(user.id)
+
+        role_holders = holders.get(role.id, set())
+        to_add = [guild.get_member(member_id) for member_id in reactors - role_holders]
+        to_add = [member for member in to_add if member is not None]
+        to_remove = []
+        if prune:
+            to_remove = [guild.get_member(member_id) for member_id in role_holders - reactors]
+            to_remove = [member for member in to_remove if member is not None and not member.bot]
+
+        if dry_run:
+            return to_add, to_remove
+
+        if not has_bot_reacted:
+            await self.add_reaction_to_message(ctx, message, self.emoji)
+
+        for member in to_add:
+            await member.add_roles(role, reason="Course sync: member reacted to the course entry.")
+        for member in to_remove:
+            await member.remove_roles(role, reason="Course sync: member has not reacted to the course entry.")
+
+        if to_add or to_remove:
+            await self.channels.log.send(
+                f"Synced `{role.name}`: added {len(to_add)}, removed {len(to_remove)} member{'s' if len(to_add) + len(to_remove) != 1 else ''}."
+            )
+        return to_add, to_remove
 
     @_courses.group(name="roles")
     async def _courses_roles(self, ctx):
@@ -505,7 +1016,8 @@ class Courses(commands.Cog):
         """
         try:
             # add initial reaction to the course to make it easier on users to add it
-            await message.add_reaction(emoji)
+            async with self.buckets["reactions"]:
+                await message.add_reaction(emoji)
         except discord.InvalidArgument:
             logger.exception(f"Emoji was not a valid emoji.")
         except discord.Forbidden:
@@ -544,29 +1056,21 @@ class Courses(commands.Cog):
         elif str(emoji) != self.emoji:
             return logger.debug("incorrect emoji")
 
-        # get the dict courses from the db
-        courses = await self.db.guild(self.bot.get_guild(self.guild_id)).get_raw("registered_courses")
-
-        # default course to None so that we know for sure if we found something
-        course = None
-
-        # get the course that has a msg_id which matches our payload
-        # then set its value to course
-        for key, val in courses.items():
-            if key == str(message_id):
-                course = val
-                break
+        # look up the course role for the message in the course index
+        role_id = self.course_index.get(message_id)
 
         # ensure that we actually got a course
-        if course is None:
+        if role_id is None:
             logger.error("course wasn't found!")
             return
 
         # get the role from the guild that matches the course
-        role = self.bot.get_guild(self.guild_id).get_role(course["role_id"])
+        role = self.bot.get_guild(self.guild_id).get_role(role_id)
+        if role is None:
+            return logger.error(f"role {role_id} for message {message_id} no longer exists.")
         
-        # update the status of the role for the member
-        await self.roles.update_member(member, role, add)
+        # update the status of the role for the member once the member stops toggling it
+        self.roles.queue_member_update(member, role, add)
         
 
     async def process_course_assignment_from_call(self, reaction: discord.Reaction, member: discord.Member):
@@ -580,6 +1084,10 @@ class Courses(commands.Cog):
         """
         Handles the processing of the reaction from a trigger.
         """
+        # reactions on anything other than a course entry are not our concern
+        if payload.message_id not in self.course_index:
+            return
+
         # get the member from the guild using the user_id in the payload
         member = self.bot.get_guild(payload.guild_id).get_member(payload.user_id)
         if member is None:
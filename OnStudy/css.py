@@ -8,7 +8,11 @@ from redbot.core import Config, checks, commands
 from redbot.core.utils.chat_formatting import humanize_list
 from redbot.core.utils.predicates import MessagePredicate
 
+from .bulkconfig import update_members
+from .dueheap import DueHeap
+from .joinburst import JoinAggregator, batch_members
 from .logger import logger
+from .throttle import TokenBucket, run_bounded
 
 
 class CSS(commands.Cog):
@@ -26,6 +30,17 @@ class CSS(commands.Cog):
         }
     }
 
+    # DMs per second prodAll may send, and how many it has in flight at once
+    prod_dms_per_second = 2
+    prod_workers = 4
+    # days a new member has to pick their courses before they are prodded automatically
+    auto_prod_after_days = 2
+    # joins within this many seconds of each other share one welcome message
+    join_window_seconds = 10
+    # this many joins within join_alert_seconds alerts the admins
+    join_alert_count = 15
+    join_alert_seconds = 60
+
     properties = {
         "prod_protection_days": 2,
         "channels": None,
@@ -44,6 +59,28 @@ class CSS(commands.Cog):
             "last_prodded": None
         }
         self.db.register_member(**default_member)
+        default_guild = {
+            # prod members without courses automatically once they are due
+            "auto_prod": False,
+            # unix time the most recently greeted member joined at
+            "last_greeted_join": None
+        }
+        self.db.register_guild(**default_guild)
+
+        # members without courses, ordered by when they may next be prodded
+        self.prod_schedule = DueHeap()
+        self._auto_prod = False
+        self._schedule_changed = asyncio.Event()
+        self._auto_prod_task = asyncio.create_task(self._auto_prod_loop())
+
+        self.joins = JoinAggregator(
+            self._welcome_joined,
+            window=self.join_window_seconds,
+            on_alert=self._join_alert,
+            alert_joins=self.join_alert_count,
+            alert_window=self.join_alert_seconds
+        )
+        self._catch_up_task = asyncio.create_task(self._catch_up())
 
         # await self.bot.wait_until_ready()
         # self.utility_roles["admin"]["ref"] = self.bot.get_guild(self.guild_id).get_role(self.utility_roles["admin"]["id"])
@@ -52,32 +89,62 @@ class CSS(commands.Cog):
     async def pastGreet(self, ctx=None):
         """
         Greets members that joined the server while the bot was unavailable
+
+        Anyone who joined after the last greeted join time is greeted, however long the bot was away.
         """
-        recentlyJoinedMembers = []
-        messageLimit = 50
+        guild = self.bot.get_guild(self.guild_id)
+        if guild is None:
+            return
 
-        # scan through the `messageLimit` most recent messages, add any new member announcment to the list of
-        # `recentlyJoinedMembers` exit as soon as there is message from the bot found
-        async for message in self.properties["channels"].newMembers.history(limit=messageLimit):
-            member = message.author
-            if not member.bot and self.properties["logic"].validate_member(member):
-                if member.guild == self.bot.get_guild(self.guild_id) and message.type == discord.MessageType.new_member:
-                    recentlyJoinedMembers.append(message)
-            else:
-                break
+        last_greeted = await self.db.guild(guild).last_greeted_join()
+        if last_greeted is None:
+            # nothing to compare against yet, so only start counting from now
+            return await self.db.guild(guild).last_greeted_join.set(self.join_time(datetime.utcnow()))
+
+        recentlyJoinedMembers = sorted(
+            (
+                member for member in guild.members
+                if not member.bot and member.joined_at is not None and self.join_time(member.joined_at) > last_greeted
+            ),
+            key=lambda member: member.joined_at
+        )
 
         size = len(recentlyJoinedMembers)
-        await self.properties["channels"].log.send(f"{size} new member{'s' if size != 1 else ''} greeted since I was last online.")
+        self.properties["channels"].log_sink.write(f"{size} new member{'s' if size != 1 else ''} greeted since I was last online.")
 
         # if our list is empty then we don't need to do anything else
         if not recentlyJoinedMembers:
             return
-          
-        members = [message.author for message in recentlyJoinedMembers]
 
-        #  for message in recentlyJoinedMembers:
-        await self.welcome(self.properties["channels"].newMembers, members)
-        
+        # welcome splits the list into as many messages as it needs
+        await self.welcome(self.properties["channels"].newMembers, recentlyJoinedMembers)
+        await self.mark_greeted(guild, recentlyJoinedMembers)
+
+    async def _catch_up(self):
+        """
+        Greets anyone who joined while the bot was offline once the bot is ready.
+        """
+        await self.bot.wait_until_ready()
+        try:
+            await self.pastGreet()
+        except Exception:
+            logger.exception("Greeting members who joined while offline failed.")
+
+    def join_time(self, moment: datetime):
+        """
+        Returns the unix timestamp of a naive UTC datetime.
+        """
+        return (moment - datetime(1970, 1, 1)).total_seconds()
+
+    async def mark_greeted(self, guild: discord.Guild, members):
+        """
+        Moves the last greeted join time up to the latest join among 'members'.
+        """
+        joined = [self.join_time(member.joined_at) for member in members if member.joined_at is not None]
+        if not joined:
+            return
+        last_greeted = await self.db.guild(guild).last_greeted_join()
+        await self.db.guild(guild).last_greeted_join.set(max(joined + [last_greeted or 0]))
 
     async def prodMember(self, ctx, member: discord.Member = None):
         """
@@ -98,21 +165,154 @@ class CSS(commands.Cog):
 
         with contextlib.suppress(discord.HTTPException):
             # we don't want blocked DMs preventing us from prodding
-            await member.send(
-                f"Hi {member.display_name}.\n"
-                f"You have been on the **{member.guild.name}** discord server for a bit but haven't signed up for any courses.\n\n"
-                "In order to get the most use out of the server you will need to do that so that you can see the groups for your courses.\n\n"
-                "Don't reply to this message as this is just a bot.\n"
-                f"Instead visit the server and grab your courses in the **#{self.properties['channels'].courseList.name}** channel. Hope to see you soon."
-            )
+            await member.send(self.prod_message(member))
 
         await self.db.member(member).last_prodded.set(now.timestamp())
+        self.schedule_prod(member, now.timestamp())
         logger.debug("prodded member")
 
         await self.properties["channels"].log.send(f"Prodded **{member.display_name}** as requested.")
 
         return True
-        
+
+    def prod_message(self, member: discord.Member):
+        """
+        The DM sent to a member who hasn't picked any courses
+        """
+        return (
+            f"Hi {member.display_name}.\n"
+            f"You have been on the **{member.guild.name}** discord server for a bit but haven't signed up for any courses.\n\n"
+            "In order to get the most use out of the server you will need to do that so that you can see the groups for your courses.\n\n"
+            "Don't reply to this message as this is just a bot.\n"
+            f"Instead visit the server and grab your courses in the **#{self.properties['channels'].courseList.name}** channel. Hope to see you soon."
+        )
+
+    async def prod_members(self, guild: discord.Guild, members):
+        """
+        Prods every member in 'members' who hasn't been prodded recently.
+
+        Every member's last prod time is read in one go, DMs are sent a few at a time
+        within the DM budget and the new prod times are written back in one go.
+        Returns the number of members prodded, skipped and with blocked DMs.
+        """
+        prodded = await self.db.all_members(guild)
+        now = datetime.utcnow()
+        protection = timedelta(days=self.properties["prod_protection_days"])
+
+        eligible = []
+        for member in members:
+            last_prodded = prodded.get(member.id, {}).get("last_prodded")
+            if last_prodded is not None and datetime.fromtimestamp(last_prodded) + protection > now:
+                continue
+            eligible.append(member)
+
+        bucket = TokenBucket(self.prod_dms_per_second)
+        results = {"sent": [], "blocked": []}
+        log_sink = self.properties["channels"].log_sink
+
+        def build_job(member):
+            async def job():
+                async with bucket:
+                    try:
+                        await member.send(self.prod_message(member))
+                    except discord.HTTPException:
+                        # blocked DMs still count as prodded so they aren't retried every time
+                        results["blocked"].append(member)
+                        log_sink.write(f"Couldn't DM **{member.display_name}**, they were marked as prodded.")
+                    else:
+                        results["sent"].append(member)
+                        log_sink.write(f"Prodded **{member.display_name}** as requested.")
+            return job
+
+        await run_bounded([build_job(member) for member in eligible], workers=self.prod_workers)
+
+        await update_members(self.db, guild.id, {
+            member.id: {"last_prodded": now.timestamp()} for member in results["sent"] + results["blocked"]
+        })
+
+        return len(results["sent"]), len(members) - len(eligible), len(results["blocked"])
+
+    def needs_courses(self, member: discord.Member):
+        """
+        Whether the member has yet to pick any courses
+        """
+        return not member.bot and len(member.roles) < 2
+
+    def schedule_prod(self, member: discord.Member, last_prodded: float = None):
+        """
+        Puts the member on the prod schedule for when they are next due,
+        or takes them off it if they have picked their courses.
+        """
+        if not self.needs_courses(member):
+            self.prod_schedule.remove(member.id)
+            return
+
+        due = (member.joined_at or datetime.utcnow()) + timedelta(days=self.auto_prod_after_days)
+        if last_prodded is not None:
+            due = max(due, datetime.fromtimestamp(last_prodded) + timedelta(days=self.properties["prod_protection_days"]))
+        self.prod_schedule.push(member.id, due.timestamp())
+        self._schedule_changed.set()
+
+    async def _auto_prod_loop(self):
+        """
+        Sleeps until the next member on the prod schedule is due and then prods everyone who is.
+        """
+        await self.bot.wait_until_ready()
+        guild = self.bot.get_guild(self.guild_id)
+        if guild is None:
+            return
+
+        self._auto_prod = await self.db.guild(guild).auto_prod()
+        prodded = await self.db.all_members(guild)
+        for member in guild.members:
+            self.schedule_prod(member, prodded.get(member.id, {}).get("last_prodded"))
+        logger.info(f"{len(self.prod_schedule)} members without courses are on the prod schedule.")
+
+        while True:
+            self._schedule_changed.clear()
+            next_due = self.prod_schedule.peek()
+            if not self._auto_prod or next_due is None:
+                timeout = None
+            else:
+                timeout = max(next_due[0] - datetime.utcnow().timestamp(), 0)
+
+            try:
+                # woken early whenever the schedule or the setting changes
+                await asyncio.wait_for(self._schedule_changed.wait(), timeout=timeout)
+                continue
+            except asyncio.TimeoutError:
+                pass
+
+            try:
+                await self.auto_prod(guild)
+            except Exception:
+                logger.exception("Prodding members automatically failed.")
+
+    async def auto_prod(self, guild: discord.Guild):
+        """
+        Prods every member on the schedule who is due and puts them back on it for their next prod.
+        """
+        now = datetime.utcnow().timestamp()
+        members = [guild.get_member(member_id) for member_id in self.prod_schedule.pop_due(now)]
+        members = [member for member in members if member is not None and self.needs_courses(member)]
+        if not members:
+            return
+
+        sent, skipped, blocked = await self.prod_members(guild, members)
+        for member in members:
+            self.schedule_prod(member, now)
+
+        if sent or blocked:
+            self.properties["channels"].log_sink.write(
+                f"Automatically prodded {sent + blocked} member{'s' if sent + blocked != 1 else ''} "
+                f"without courses ({blocked} with blocked DMs)."
+            )
+
+    def cog_unload(self):
+        self._auto_prod_task.cancel()
+        self.joins.cancel()
+        self._catch_up_task.cancel()
+
     async def welcome(self, channel=None, members=None):
         """
         Helper function to handle the welcoming of a user
@@ -129,11 +329,34 @@ class CSS(commands.Cog):
         if not members:
             return
 
-        mentionList = [member.mention for member in members]
+        def render(batch):
+            mentionList = [member.mention for member in batch]
+            return (
+                f"Welcome {humanize_list(mentionList)}! Check out the {self.properties['channels'].anchor(self.properties['channels'].welcome.id)} channel for some information about the server."
+            )
 
-        await channel.send(
-            f"Welcome {humanize_list(mentionList)}! Check out the {self.properties['channels'].anchor(self.properties['channels'].welcome.id)} channel for some information about the server."
+        # a big enough group of members won't fit in one message
+        for batch in batch_members(members, render):
+            await channel.send(render(batch))
+
+    async def _welcome_joined(self, members):
+        """
+        Welcomes the members who joined during one join window
+        """
+        members = [member for member in members if self.properties["logic"].validate_member(member)]
+        await self.welcome(self.properties["channels"].newMembers, members)
+        await self.mark_greeted(self.bot.get_guild(self.guild_id), members)
+
+    async def _join_alert(self, joins: int):
+        """
+        Warns the admins that members are joining much faster than usual
+        """
+        msg = (
+            f"<@&{self.utility_roles['admin']['id']}>: {joins} members joined in the last "
+            f"{self.join_alert_seconds} seconds. This could be a raid."
         )
+        logger.warning(msg)
+        await self.properties["channels"].log.send(msg)
         
 
     # user commands
@@ -184,24 +407,47 @@ class CSS(commands.Cog):
             # build list of members without roles
             membersWithoutRoles = [member for member in ctx.guild.members if len(member.roles) < 2]
 
-            log = self.properties["channels"].log
-
             size = len(membersWithoutRoles)
             if size == 0:
                 return await ctx.send("All members are have courses.")
 
             await ctx.send(f"Prodding {size} member{'s' if size != 1 else ''}.")
 
-            async with log.typing():
-                for member in membersWithoutRoles:
-                    await self.prodMember(ctx, member)
+            async with ctx.typing():
+                sent, skipped, blocked = await self.prod_members(ctx.guild, membersWithoutRoles)
 
             # announce that the bot is done prodding members
-            await log.send(f"\n\nCompleted prodding necessary members.")
+            summary = (
+                f"Completed prodding necessary members. "
+                f"Sent: {sent}, skipped (prodded recently): {skipped}, blocked DMs: {blocked}."
+            )
+            self.properties["channels"].log_sink.write(summary)
 
-            await ctx.send(f"Finished.")
+            await ctx.send(summary)
         else:
             return await ctx.send("Standing down.")
+
+    @commands.command()
+    @checks.admin()
+    async def autoprod(self, ctx, enabled: bool = None):
+        """
+        Turns automatic prodding of members without courses on or off.
+        """
+        if enabled is None:
+            enabled = await self.db.guild(ctx.guild).auto_prod()
+            return await ctx.send(f"Automatic prodding is {'on' if enabled else 'off'}.")
+
+        await self.db.guild(ctx.guild).auto_prod.set(enabled)
+        self._auto_prod = enabled
+        self._schedule_changed.set()
+
+        if enabled:
+            await ctx.send(
+                f"Members without courses will be prodded {self.auto_prod_after_days} days after joining "
+                f"and every {self.properties['prod_protection_days']} days after that."
+            )
+        else:
+            await ctx.send("Automatic prodding is off.")
         
 
     # custom events
@@ -224,7 +470,20 @@ class CSS(commands.Cog):
         if member.guild != self.bot.get_guild(self.guild_id):
             return
 
-        await self.welcome(self.properties["channels"].newMembers, member)
+        self.schedule_prod(member)
+        self.joins.add(member)
+
+    @commands.Cog.listener("on_member_update")
+    async def member_roles_changed(self, before, after):
+        """
+        Keeps the prod schedule in step with members picking or dropping their courses
+        """
+        if after.guild.id != self.guild_id or before.roles == after.roles:
+            return
+
+        # members already on the schedule keep their place
+        if not self.needs_courses(after) or after.id not in self.prod_schedule:
+            self.schedule_prod(after)
         
 
     @commands.Cog.listener("on_member_remove")
@@ -236,4 +495,5 @@ class CSS(commands.Cog):
         if member.guild != self.bot.get_guild(self.guild_id):
             return
 
+        self.prod_schedule.remove(member.id)
         await self.properties["channels"].log.send(f"<@&{self.utility_roles['admin']['id']}>: {member.display_name} ({member.name}#{member.discriminator}) has left the building.")
@@ -0,0 +1,97 @@
+class DueHeap:
+    """
+    A min-heap of (due time, member id) that knows where every member sits in it.
+
+    Knowing each member's position lets a member be moved or taken out of the
+    heap in O(log n) without searching for them first.
+    """
+
+    def __init__(self):
+        self._heap = []
+        self._positions = {}
+
+    def __len__(self):
+        return len(self._heap)
+
+    def __contains__(self, member_id: int):
+        return member_id in self._positions
+
+    def push(self, member_id: int, due: float):
+        """
+        Schedules the member for 'due', replacing any time they were already scheduled for.
+        """
+        index = self._positions.get(member_id)
+        if index is None:
+            self._heap.append((due, member_id))
+            self._positions[member_id] = len(self._heap) - 1
+            self._sift_up(len(self._heap) - 1)
+            return
+
+        old_due = self._heap[index][0]
+        self._heap[index] = (due, member_id)
+        if due < old_due:
+            self._sift_up(index)
+        else:
+            self._sift_down(index)
+
+    def remove(self, member_id: int):
+        """
+        Takes the member out of the heap. Does nothing if they aren't in it.
+        """
+        index = self._positions.pop(member_id, None)
+        if index is None:
+            return
+
+        last = self._heap.pop()
+        if index == len(self._heap):
+            return
+        self._heap[index] = last
+        self._positions[last[1]] = index
+        self._sift_up(index)
+        self._sift_down(self._positions[last[1]])
+
+    def peek(self):
+        """
+        Returns the (due time, member id) that is due first, or NoneType if the heap is empty.
+        """
+        return self._heap[0] if self._heap else None
+
+    def pop_due(self, now: float):
+        """
+        Removes and returns the ids of every member due at or before 'now', earliest first.
+        """
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            member_id = self._heap[0][1]
+            self.remove(member_id)
+            due.append(member_id)
+        return due
+
+    def clear(self):
+        self._heap.clear()
+        self._positions.clear()
+
+    def _swap(self, i: int, j: int):
+        self._heap[i], self._heap[j] = self._heap[j], self._heap[i]
+        self._positions[self._heap[i][1]] = i
+        self._positions[self._heap[j][1]] = j
+
+    def _sift_up(self, index: int):
+        while index > 0:
+            parent = (index - 1) // 2
+            if self._heap[index] >= self._heap[parent]:
+                break
+            self._swap(index, parent)
+            index = parent
+
+    def _sift_down(self, index: int):
+        size = len(self._heap)
+        while True:
+            smallest = index
+            for child in (2 * index + 1, 2 * index + 2):
+                if child < size and self._heap[child] < self._heap[smallest]:
+                    smallest = child
+            if smallest == index:
+                break
+            self._swap(index, smallest)
+            index = smallest
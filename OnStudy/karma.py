@@ -1,10 +1,22 @@
 from redbot.core import Config, commands, checks
-from redbot.core.utils.chat_formatting import error, info, warning
+from redbot.core.data_manager import cog_data_path
+from redbot.core.utils.chat_formatting import box, error, humanize_list, info, warning
 from redbot.core.utils.predicates import MessagePredicate
 from redbot.core.utils.embed import randomize_color
+from .karmalog import KarmaEventLog
+from .karmastore import ConfigKarmaStore, SQLiteKarmaStore
+from .leaderboard import Leaderboard
 from .logger import logger
+from .scanner import HistoryScanner
+from .throttle import TokenBucket
 
+from datetime import datetime, timedelta
+
+import asyncio
+import collections
+import copy
 import discord
+import time
 
 class Karma(commands.Cog):
     """
@@ -16,6 +28,22 @@ class Karma(commands.Cog):
         "logic": None,
         "karma_per_vote": 1
     }
+    # history and reaction requests per second shared by every karma sync worker
+    sync_requests_per_second = 5
+    # how many message authors are remembered for live reactions
+    author_cache_size = 5000
+    # seconds between writes of buffered karma to the karma store
+    flush_interval = 30
+    # how many members and operations `karma settings benchmark` uses
+    benchmark_members = 500
+    benchmark_top = 10
+    # how many days of karma each member keeps in their ring of daily buckets
+    karma_window_days = 30
+    # window name -> days, each no longer than karma_window_days
+    karma_windows = {
+        "week": 7,
+        "month": 30
+    }
     karma_roles = {
         "thanked": {
             "name": "been_thanked",
@@ -36,19 +64,108 @@ class Karma(commands.Cog):
     
         self.db = Config.get_conf(self, identifier=1742113358, force_registration=True)
         
-        default_member = {
+        # "days" is a ring of daily karma ending on "day", "week" and "month" are its running window sums
+        self.default_member = default_member = {
             "been_thanked": {
                 "total": 0,
-                "current": 0
+                "current": 0,
+                "day": None,
+                "days": [],
+                "week": 0,
+                "month": 0
             },
             "thanked_others": {
                 "total": 0,
-                "current": 0
+                "current": 0,
+                "day": None,
+                "days": [],
+                "week": 0,
+                "month": 0
             }
         }
 
         self.db.register_member(**default_member)
 
+        default_guild = {
+            # how many channels karma sync scans at once
+            "sync_workers": 4,
+            # channel id -> id of the newest message karma sync has scanned
+            "watermarks": {},
+            # channel id -> message id -> [giver id, receiver id, day, amount] for karma given live
+            # on messages the next incremental sync will scan, so that it isn't counted twice
+            "unscanned_karma": {},
+            # "MM-DD" dates on which a new term starts and current karma goes back to zero
+            "semester_starts": [],
+            # the last day the karma windows were rolled over to
+            "last_rollover": None,
+            # karma earned per endorsement
+            "karma_per_vote": 1,
+            # where member karma is kept, "config" or "sqlite"
+            "karma_backend": "config",
+            # whether the event log holds every endorsement, which only a finished full sync can promise
+            "event_log_complete": False
+        }
+
+        self.db.register_guild(**default_guild)
+
+        # sync workers may update the same member at the same time
+        self._karma_lock = asyncio.Lock()
+
+        # message id -> author id, least recently used first
+        self._message_authors = collections.OrderedDict()
+
+        # member karma records, swapped for SQLite in initialize if the guild uses it
+        self.store = ConfigKarmaStore(self.db, self.guild_id)
+
+        # member id -> karma record with changes not yet written to the store
+        self._karma_buffer = {}
+        # channel id -> id of the newest message karma sync has scanned, as saved in Config
+        self._watermarks = {}
+        # channel id -> message id -> (giver id, receiver id, day, amount, event number) for karma
+        # given live past the watermark, written to Config along with the buffered karma
+        self._unscanned = {}
+        self._unscanned_dirty = False
+        # counts live endorsements so a sync can tell which it saw
+        self._event_count = 0
+        # only one sync may run at a time, and live karma is recorded throughout a full one
+        self._sync_running = False
+        self._full_sync_running = False
+        self._flush_task = asyncio.create_task(self._flush_loop())
+
+        # (karma category, "current", "total", "week" or "month") -> members ordered by that score
+        self.leaderboards = {
+            (category["name"], field): Leaderboard()
+            for category in self.karma_roles.values()
+            for field in ("current", "total", *self.karma_windows)
+        }
+
+        self._rollover_task = asyncio.create_task(self._rollover_loop())
+
+        # every endorsement seen, so that scores can be rebuilt without Discord
+        self.event_log = KarmaEventLog(cog_data_path(self) / "karma_events.bin")
+
+    async def initialize(self):
+        """
+        Builds the leaderboards from the stored karma
+        """
+        guild_data = await self.db.all_guilds()
+        self.properties["karma_per_vote"] = guild_data.get(self.guild_id, {}).get("karma_per_vote", 1)
+        self._watermarks = dict(guild_data.get(self.guild_id, {}).get("watermarks", {}))
+        self._unscanned = {
+            channel_id: {
+                message_id: [(*entry, 0) for entry in entries]
+                for message_id, entries in messages.items()
+            }
+            for channel_id, messages in guild_data.get(self.guild_id, {}).get("unscanned_karma", {}).items()
+        }
+        if guild_data.get(self.guild_id, {}).get("karma_backend", "config") == SQLiteKarmaStore.name:
+            self.store = self.open_store(SQLiteKarmaStore.name)
+
+        data = await self.store.load_all()
+        for member_id, record in data.items():
+            self._update_leaderboards(member_id, record)
+        logger.info(f"Loaded karma leaderboards for {len(data)} members.")
+
     @commands.group(name="karma", aliases=["k", "Karma"])
     async def _karma(self, ctx):
         """
@@ -90,16 +207,18 @@ class Karma(commands.Cog):
 
         def build_field(group):
             return (
+                f"**This Week:** {self.nonnegative(group.get('week', 0))}\n"
+                f"**This Month:** {self.nonnegative(group.get('month', 0))}\n"
                 f"**Current:** {group['current']}\n"
                 f"**All Time:** {group['total']}"
             )
 
         try:
             been_thanked_val = build_field(
-                await self.db.member(member).been_thanked()
+                await self.get_karma(member, self.karma_roles["thanked"]["name"])
             )
             thanked_others_val = build_field(
-                await self.db.member(member).thanked_others()
+                await self.get_karma(member, self.karma_roles["thanking"]["name"])
             )
         except KeyError:
             logger.error("Member does not exist.")
@@ -110,26 +229,99 @@ class Karma(commands.Cog):
             embed.add_field(name="Thanked others", value=thanked_others_val, inline=False)
             return randomize_color(embed)
 
+    @_karma.command(name="top")
+    async def _karma_top(self, ctx, n: int = 10, category: str = "thanked", period: str = "current"):
+        """
+        Displays the members with the most karma.
+
+        n: how many members to show, up to 25.
+        category: `thanked` for karma received or `thanking` for karma given.
+        period: `week` or `month` for the last 7 or 30 days, `current` for this term or `total` for all time.
+        """
+        category = category.lower()
+        period = period.lower()
+        periods = {"week": "last 7 days", "month": "last 30 days", "current": "this term", "total": "all time"}
+        if category not in self.karma_roles:
+            return await ctx.send(error("Category must be `thanked` or `thanking`."))
+        if period not in periods:
+            return await ctx.send(error("Period must be `week`, `month`, `current` or `total`."))
+        n = min(max(n, 1), 25)
+
+        leaderboard = self.leaderboards[(self.karma_roles[category]["name"], period)]
+        top = leaderboard.top(n)
+        if not top:
+            return await ctx.send("Nobody has any karma yet.")
+
+        guild = self.bot.get_guild(self.guild_id)
+        lines = []
+        for place, (member_id, score) in enumerate(top, start=1):
+            member = guild.get_member(member_id)
+            name = member.display_name if member is not None else f"Former member ({member_id})"
+            lines.append(f"**{place}.** {name}: {score}")
+
+        title = f"Most {'thanked' if category == 'thanked' else 'thankful'} members ({periods[period]})"
+        embed = discord.Embed(title=title, description="\n".join(lines))
+        await ctx.send(embed=randomize_color(embed))
+
     @_karma.command(name="sync")
     @checks.admin()
-    async def _karma_sync(self, ctx):
+    async def _karma_sync(self, ctx, full: bool = False):
         """
         Syncs the karma scores for all users across the server. 
-        **WARNING**: This could take a long time. Please be patient.
-        """
-        # confirm this request
-        pred = await self.properties["logic"].confirm(ctx, msg=(
-            "This will reset all karma scores and then will process all of the messages on the server. "
-            "This process could take a while. **Are you sure you wish to continue?**"
-        ))
-        if pred is False:
-            return await ctx.send("Standing down.")
-        else:
-            await ctx.send("Beginning process.")
-            logger.debug("Syncing karma scores.")
 
-        # reset karma scores
-        await self.clear_karma(ctx)
+        By default only messages posted since the last sync are scanned.
+        full: reset all karma scores and rescan every message on the server.
+        **WARNING**: A full rebuild could take a long time. Please be patient.
+        """
+        guild = self.bot.get_guild(self.guild_id)
+        watermarks = {} if full else dict(self._watermarks)
+
+        if self._sync_running:
+            return await ctx.send(warning("A karma sync is already running."))
+
+        if not full and not watermarks:
+            return await ctx.send(warning(
+                f"Karma has never been fully synced. Run `{ctx.prefix}karma sync yes` to rebuild it first."
+            ))
+
+        if full:
+            # confirm this request
+            pred = await self.properties["logic"].confirm(ctx, msg=(
+                "This will reset all karma scores and then will process all of the messages on the server. "
+                "This process could take a while. **Are you sure you wish to continue?**"
+            ))
+            if pred is False:
+                return await ctx.send("Standing down.")
+
+        # another sync may have started while waiting for confirmation
+        if self._sync_running:
+            return await ctx.send(warning("A karma sync is already running."))
+
+        self._sync_running = True
+        self._full_sync_running = full
+        try:
+            await self._run_karma_sync(ctx, guild, full, watermarks)
+        finally:
+            self._sync_running = False
+            self._full_sync_running = False
+
+    async def _run_karma_sync(self, ctx, guild: discord.Guild, full: bool, watermarks: dict):
+        """
+        Scans the channels and commits the karma found. Only one sync runs at a time.
+        """
+        await ctx.send("Beginning process.")
+        logger.debug("Syncing karma scores.")
+
+        if full:
+            # reset karma scores
+            await self.clear_karma(ctx)
+            self._watermarks = {}
+            self._unscanned = {}
+            self._unscanned_dirty = False
+            await self.db.guild(guild).watermarks.clear()
+            await self.db.guild(guild).unscanned_karma.clear()
+            await self.db.guild(guild).event_log_complete.set(False)
+            self.event_log.clear()
 
         async def status_msg(ctx, msg, *, msgObj = None):
             if msgObj is None:
@@ -140,83 +332,135 @@ class Karma(commands.Cog):
                 logger.exception("Editing sync heartbeat message failed.")
 
         # get the list of channels
-        channels = self.bot.get_guild(self.guild_id).text_channels
-        channels_processed = 0
+        channels = []
+        for channel in guild.text_channels:
+            if channel.id in self.properties["channels"].ids.values():
+                logger.info(f"Skipping channel {channel.name} during karma sync.")
+                continue
+            channels.append(channel)
+
+        workers = await self.db.guild(guild).sync_workers()
+        scanner = HistoryScanner(TokenBucket(self.sync_requests_per_second), workers=workers)
+        progress = {"channels": 0, "endorsements": {}}
 
         # annouce how many channels are to be processed
-        channels_processed_msg = lambda current, total: f"Processed {current} of {total} channels."
-        processedMsgObj = await status_msg(ctx, channels_processed_msg(channels_processed, len(channels)))
+        channels_processed_msg = lambda current, total: (
+            f"Processed {current} of {total} channels with {workers} workers "
+            f"({scanner.rate:.1f} messages/sec)."
+        )
+        processedMsgObj = await status_msg(ctx, channels_processed_msg(0, len(channels)))
 
-        latest_channel_msgObj = None
-        async with ctx.channel.typing():
-            # iterate through each channel:
-            for channel in channels:
-                if channel.id in self.properties["channels"].ids.values():
-                    logger.info(f"Skipping channel {channel.name} during karma sync.")
+        # channel id -> member id -> karma category -> points earned, written out once the scan is done
+        tallies = {}
+        # channel id -> id of the newest message scanned in it
+        newest = {}
+        # channel id -> message id -> how many live endorsements had been recorded when it was read,
+        # kept only for messages with live karma waiting to be settled
+        seen = {}
+
+        def mark_seen(channel, message):
+            if str(message.id) in self._unscanned.get(str(channel.id), {}):
+                seen.setdefault(channel.id, {})[message.id] = self._event_count
+        skipped = {"authors": 0, "users": 0, "ignored": 0}
+
+        def history(channel):
+            if str(channel.id) in watermarks:
+                # oldest first from just after the last message scanned
+                return {"limit": None, "after": discord.Object(id=watermarks[str(channel.id)])}
+            return {"limit": None}
+
+        async def process_message(channel, message):
+            newest[channel.id] = max(newest.get(channel.id, 0), message.id)
+            mark_seen(channel, message)
+            tally = tallies.setdefault(channel.id, {})
+            day = self.day_number(message.created_at)
+
+            # process the reactions for the karma one
+            if message.author.bot:
+                return
+            if not self.properties["logic"].validate_member(message.author):
+                skipped["authors"] += 1
+                return
+
+            for react in message.reactions:
+                if (str(react.emoji) != self.thumbs_up_emoji):
                     continue
 
-                endorsements = 0     
-                msg_count = 0
-                # iterate through the message history
-                async for message in channel.history(limit=None):
-                    msg_count += 1
-                    # process the reactions for the karma one
-                    payload = {}
-                    if message.author.bot:
+                logger.debug("Found endorsement")
+
+                # live endorsements from here on may or may not be in the list of users
+                mark_seen(channel, message)
+                for user in await scanner.reaction_users(react):
+                    if not self.properties["logic"].validate_member(user):
+                        skipped["users"] += 1
                         continue
-                    if not self.properties["logic"].validate_member(message.author):
-                        await self.properties["channels"].log.send(error(
-                                    f"Skipped author {message.author.display_name} for message "
-                                    f"{message.id} in channel {channel.name} as "
-                                    "this user is not a valid member."
-                            ))
+
+                    # apply the normal rules for adding karma
+                    if not self.tally_endorsement(tally, user, message.author, day):
+                        skipped["ignored"] += 1
                         continue
+                    self.event_log.append(
+                        user.id, message.author.id, message.id,
+                        self.timestamp(message.created_at), KarmaEventLog.SEEN
+                    )
+                    progress["endorsements"][channel.id] = progress["endorsements"].get(channel.id, 0) + 1
 
-                    payload["recipient"] = message.author                        
-                    for react in message.reactions:
-                        if (str(react.emoji) != self.thumbs_up_emoji):
-                            continue
-
-                        logger.debug("Found endorsement")
-
-                        async for user in react.users():
-                            if not self.properties["logic"].validate_member(user):
-                                await self.properties["channels"].log.send(error(
-                                    f"Skipped user {user.display_name} for message "
-                                    f"{message.id} in channel {channel.name} as "
-                                    "this user is not a valid member."
-                                    ))
-                                continue
-
-                            # we have a user who is a valid member of the guild
-                            payload["sender"] = user
-
-                            await self.properties["channels"].log.send(
-                                f"Endorsement to `{payload['recipient'].display_name}` from `{payload['sender'].display_name}`"
-                            )
-
-                            # apply the normal rules for adding karma
-                            await self.process_reaction(payload=payload)
-                            endorsements += 1
-
-                # announce channel is done
-                latest_channel = lambda channel: f"Processed channel: {channel}."
-                if latest_channel_msgObj is None:
-                    latest_channel_msgObj = await status_msg(ctx, latest_channel(channel.name))
-                else:                    
-                    await status_msg(ctx, latest_channel(channel.name), msgObj = latest_channel_msgObj)
-                logger.debug(latest_channel(channel.name))
-
-                await ctx.send(info(
-                    f"**__{channel.name}:__**\n"
-                    f"messages: {msg_count}\n"
-                    f"endorsements: {endorsements}"
-                ))
-                
-                channels_processed += 1
+        async def channel_done(channel, msg_count):
+            # announce channel is done
+            logger.debug(f"Processed channel: {channel.name}.")
+            await ctx.send(info(
+                f"**__{channel.name}:__**\n"
+                f"messages: {msg_count}\n"
+                f"endorsements: {progress['endorsements'].get(channel.id, 0)}"
+            ))
 
-                # edit channel processed message to update the completed number
-                await status_msg(ctx, channels_processed_msg(channels_processed, len(channels)), msgObj=processedMsgObj)
+            progress["channels"] += 1
+
+            # edit channel processed message to update the completed number
+            await status_msg(ctx, channels_processed_msg(progress["channels"], len(channels)), msgObj=processedMsgObj)
+
+        async with ctx.channel.typing():
+            results = await scanner.scan(channels, process_message, on_channel_done=channel_done, history=history)
+
+            tally = {}
+            failed = 0
+            for channel, result in zip(channels, results):
+                if isinstance(result, discord.Forbidden):
+                    failed += 1
+                    await ctx.send(warning(f"Skipped {channel.name}: I can't read its history."))
+                    continue
+                elif isinstance(result, Exception):
+                    failed += 1
+                    logger.error(f"Scanning channel {channel.name} failed.", exc_info=result)
+                    await ctx.send(error(f"Scanning {channel.name} failed. Check the log."))
+                    continue
+
+                # only completely scanned channels count, the rest are rescanned next time
+                self.merge_tally(tally, tallies.get(channel.id, {}))
+                self.settle_unscanned_karma(tally, channel.id, newest.get(channel.id, 0), seen.get(channel.id, {}))
+
+                if channel.id in newest:
+                    self._watermarks[str(channel.id)] = newest[channel.id]
+
+            await self.commit_tally(guild, tally)
+            await self.db.guild(guild).watermarks.set(self._watermarks)
+            await self.event_log.compact()
+            if full and not failed:
+                # from here on live reactions and incremental syncs keep the log complete
+                await self.db.guild(guild).event_log_complete.set(True)
+
+            endorsements = sum(progress["endorsements"].values())
+            summary = (
+                f"Karma sync scanned {scanner.messages} messages in {scanner.elapsed:.0f} seconds "
+                f"({scanner.rate:.1f} messages/sec).\n"
+                f"Endorsements counted: {endorsements}\n"
+                f"Members updated: {len(tally)}\n"
+                f"Endorsements ignored (self or bot): {skipped['ignored']}\n"
+                f"Messages from departed members skipped: {skipped['authors']}\n"
+                f"Reactions from departed members skipped: {skipped['users']}"
+            )
+            await ctx.send(info(summary))
+            self.properties["channels"].log_sink.write(summary)
             await ctx.send("Done.")
             logger.debug("Done.")
 
@@ -244,11 +488,211 @@ class Karma(commands.Cog):
             await self.clear_karma(ctx)
         await ctx.send("Done.")
 
+    @_karma_settings.command(name="workers")
+    @checks.admin()
+    async def _karma_settings_workers(self, ctx, workers: int):
+        """
+        Sets how many channels karma sync scans at once.
+        """
+        if workers < 1:
+            return await ctx.send(error("There must be at least one worker."))
+
+        await self.db.guild(ctx.guild).sync_workers.set(workers)
+        await ctx.send(f"Karma sync will scan {workers} channel{'s' if workers != 1 else ''} at once.")
+
+    @_karma_settings.command(name="semesters")
+    @checks.admin()
+    async def _karma_settings_semesters(self, ctx, *dates: str):
+        """
+        Sets the dates a new term starts on, as `MM-DD`. Current karma is reset on each.
+
+        ex. `01-10 08-20`
+        """
+        if not dates:
+            dates = await self.db.guild(ctx.guild).semester_starts()
+            if not dates:
+                return await ctx.send("No term start dates are set, so current karma is never reset.")
+            return await ctx.send(f"Terms start on {humanize_list(list(dates))}.")
+
+        try:
+            for date in dates:
+                # a leap year so that 02-29 is accepted
+                datetime.strptime(f"2000-{date}", "%Y-%m-%d")
+        except ValueError:
+            return await ctx.send(error(f"`{date}` is not a valid `MM-DD` date."))
+
+        await self.db.guild(ctx.guild).semester_starts.set(list(dates))
+        await ctx.send(f"Terms will start on {humanize_list(list(dates))}.")
+
+    @_karma_settings.command(name="recompute")
+    @checks.admin()
+    async def _karma_settings_recompute(self, ctx, karma_per_vote: int = None):
+        """
+        Rebuilds every member's karma from the karma event log without contacting Discord.
+
+        karma_per_vote: if supplied, the new amount of karma each endorsement is worth.
+        """
+        if not await self.db.guild(ctx.guild).event_log_complete():
+            return await ctx.send(warning(
+                "The karma event log doesn't hold every endorsement yet. "
+                f"Run `{ctx.prefix}karma sync yes` to fill it before recomputing."
+            ))
+
+        if karma_per_vote is not None and karma_per_vote < 1:
+            return await ctx.send(error("Each endorsement must be worth at least one karma."))
+
+        msg = (
+            "Replace every member's karma with scores rebuilt from the karma event log?"
+            " There is **no** undo option!"
+        )
+        if not await self.properties["logic"].confirm(ctx, msg=msg):
+            return await ctx.send("Standing down.")
+
+        if karma_per_vote is not None:
+            self.properties["karma_per_vote"] = karma_per_vote
+            await self.db.guild(ctx.guild).karma_per_vote.set(karma_per_vote)
+
+        async with ctx.channel.typing():
+            started = time.monotonic()
+            standing = await self.event_log.standing()
+
+            today = self.day_number(datetime.utcnow())
+            term_start = self.term_start_day(await self.db.guild(ctx.guild).semester_starts(), today)
+
+            tally = {}
+            for (giver_id, receiver_id, message_id), timestamp in standing.items():
+                day = int(timestamp // 86400)
+                self.tally_karma(tally, giver_id, receiver_id, day, self.properties["karma_per_vote"])
+
+            data = {}
+            for member_id, counts in tally.items():
+                record = data[member_id] = copy.deepcopy(self.default_member)
+                for category_id, days in counts.items():
+                    thank_category = record[category_id] = {
+                        "total": self.nonnegative(sum(days.values())),
+                        "current": self.nonnegative(sum(
+                            amount for day, amount in days.items() if term_start is None or day >= term_start
+                        ))
+                    }
+                    self.advance_window(thank_category, today)
+                    for day, amount in days.items():
+                        self.add_to_window(thank_category, day, amount)
+
+            async with self._karma_lock:
+                # the rebuilt scores replace everything, including anything buffered
+                self._karma_buffer.clear()
+                await self.store.replace_all(data)
+                for leaderboard in self.leaderboards.values():
+                    leaderboard.clear()
+                for member_id, record in data.items():
+                    self._update_leaderboards(member_id, record)
+
+        await ctx.send(
+            f"Recomputed karma for {len(data)} members from {len(standing)} endorsements "
+            f"in {time.monotonic() - started:.1f} seconds."
+        )
+
+    @_karma_settings.command(name="backend")
+    @checks.admin()
+    async def _karma_settings_backend(self, ctx, backend: str = None):
+        """
+        Sets where member karma is kept, `config` or `sqlite`, moving the existing karma over.
+        """
+        current = await self.db.guild(ctx.guild).karma_backend()
+        if backend is None:
+            return await ctx.send(f"Karma is kept in `{current}`.")
+
+        backend = backend.lower()
+        if backend not in (ConfigKarmaStore.name, SQLiteKarmaStore.name):
+            return await ctx.send(error("Backend must be `config` or `sqlite`."))
+        if backend == current:
+            return await ctx.send(f"Karma is already kept in `{backend}`.")
+
+        async with ctx.channel.typing():
+            async with self._karma_lock:
+                await self._flush_karma()
+                records = await self.store.load_all()
+                store = self.open_store(backend)
+                await store.replace_all(records)
+                old_store, self.store = self.store, store
+                await self.db.guild(ctx.guild).karma_backend.set(backend)
+            await old_store.close()
+
+        logger.info(f"Moved karma for {len(records)} members from {current} to {backend}.")
+        await ctx.send(f"Moved karma for {len(records)} members to `{backend}`.")
+
+    @_karma_settings.command(name="benchmark")
+    @checks.admin()
+    async def _karma_settings_benchmark(self, ctx, operations: int = 200):
+        """
+        Times karma increments and top-N queries on scratch Config and SQLite stores.
+
+        Each store is filled with `benchmark_members` members first. Real karma isn't touched.
+        operations: how many increments to time on each store.
+        """
+        operations = min(max(operations, 1), 5000)
+        category_id = self.karma_roles["thanked"]["name"]
+        today = self.day_number(datetime.utcnow())
+
+        scratch_config = Config.get_conf(
+            None, identifier=1742113358, cog_name="OnStudyKarmaBenchmark", force_registration=True
+        )
+        scratch_config.register_member(**self.default_member)
+        scratch_path = cog_data_path(self) / "karma_benchmark.sqlite3"
+        stores = (
+            ConfigKarmaStore(scratch_config, self.guild_id),
+            SQLiteKarmaStore(scratch_path, self.guild_id, self.default_member)
+        )
+
+        results = []
+        async with ctx.channel.typing():
+            for store in stores:
+                try:
+                    seed = {}
+                    for member_id in range(1, self.benchmark_members + 1):
+                        record = seed[member_id] = copy.deepcopy(self.default_member)
+                        self.apply_karma(record, category_id, member_id % 97, today)
+                    await store.replace_all(seed)
+
+                    # an unbuffered increment: read the member's category, apply the change, write it back
+                    started = time.perf_counter()
+                    for operation in range(operations):
+                        member_id = operation % self.benchmark_members + 1
+                        record = {category_id: await store.load_category(member_id, category_id)}
+                        self.apply_karma(record, category_id, 1, today)
+                        await store.save_category(member_id, category_id, record[category_id])
+                    increment = (time.perf_counter() - started) / operations
+
+                    started = time.perf_counter()
+                    for _ in range(operations):
+                        await store.top(category_id, "total", self.benchmark_top)
+                    top = (time.perf_counter() - started) / operations
+
+                    results.append((store.name, increment, top))
+                finally:
+                    await store.clear()
+                    await store.close()
+        scratch_path.unlink()
+
+        rows = [("Backend", "Increment", f"Top {self.benchmark_top}")]
+        rows += [(name, f"{increment * 1000:.2f} ms", f"{top * 1000:.2f} ms") for name, increment, top in results]
+        widths = [max(len(row[i]) for row in rows) for i in range(len(rows[0]))]
+        table = "\n".join("  ".join(cell.ljust(width) for cell, width in zip(row, widths)).rstrip() for row in rows)
+        await ctx.send(
+            f"Average over {operations} operations with {self.benchmark_members} members:\n{box(table)}"
+        )
+
     async def clear_karma(self, ctx):
         logger.info("Resetting all member's karma scores!")
         await ctx.send("Resetting all member's karma scores!")
-        await self.db.clear_all_members(ctx.guild)
+        async with self._karma_lock:
+            # buffered records would write the old scores back
+            self._karma_buffer.clear()
+            await self.store.clear()
+            for leaderboard in self.leaderboards.values():
+                leaderboard.clear()
 
+    @commands.Cog.listener("on_raw_reaction_add")
     async def on_raw_reaction_add(self, payload: discord.RawReactionActionEvent):
         """
         Member agrees to the rules.
@@ -256,11 +700,51 @@ class Karma(commands.Cog):
         await self.process_reaction(payload=payload, is_add_action=True)
         
 
+    @commands.Cog.listener("on_raw_reaction_remove")
     async def on_raw_reaction_remove(self, payload: discord.RawReactionActionEvent):
         """
         Member no longer agrees to the rules.
         """
         await self.process_reaction(payload=payload, is_add_action=False)
+
+    @commands.Cog.listener("on_message")
+    async def remember_author(self, message: discord.Message):
+        """
+        Caches who wrote each new message so reactions to it don't need a fetch.
+        """
+        if message.guild is None or message.guild.id != self.guild_id:
+            return
+        self.cache_author(message.id, message.author.id)
+
+    def cache_author(self, message_id: int, author_id: int):
+        """
+        Stores the author of a message in the author cache, evicting the least recently used entry if it is full.
+        """
+        self._message_authors[message_id] = author_id
+        self._message_authors.move_to_end(message_id)
+        if len(self._message_authors) > self.author_cache_size:
+            self._message_authors.popitem(last=False)
+
+    async def get_message_author_id(self, channel_id: int, message_id: int):
+        """
+        Returns the id of the author of a message, fetching the message only if it isn't cached.
+        Returns NoneType if the message can't be fetched.
+        """
+        author_id = self._message_authors.get(message_id)
+        if author_id is not None:
+            self._message_authors.move_to_end(message_id)
+            return author_id
+
+        channel = self.bot.get_guild(self.guild_id).get_channel(channel_id)
+        if channel is None:
+            return None
+        try:
+            message = await channel.get_message(message_id)
+        except discord.HTTPException:
+            # deleted or unreadable messages can't earn karma
+            return None
+        self.cache_author(message_id, message.author.id)
+        return message.author.id
         
 
     async def process_reaction(self, *, payload = None, is_add_action: bool = True):
@@ -274,14 +758,20 @@ class Karma(commands.Cog):
             member_receiving = payload["recipient"]
             member_giving = payload["sender"]
         else:
+            # most reactions aren't karma, so reject them before any lookups
+            if str(payload.emoji) != self.thumbs_up_emoji or payload.guild_id != self.guild_id:
+                return
+
             # get the member from the guild using the user_id in the payload
-            member_giving = self.bot.get_guild(self.guild_id).get_member(payload.user_id)
-            channel = self.bot.get_guild(self.guild_id).get_channel(payload.channel_id)
-            message = await channel.get_message(payload.message_id)
-            member_receiving = message.author        
+            guild = self.bot.get_guild(self.guild_id)
+            member_giving = guild.get_member(payload.user_id)
+            author_id = await self.get_message_author_id(payload.channel_id, payload.message_id)
+            if author_id is None:
+                return logger.debug("the message reacted to couldn't be fetched.")
+            member_receiving = guild.get_member(author_id)
 
-            if str(payload.emoji) != self.thumbs_up_emoji:
-                return
+            if member_giving is None or member_receiving is None:
+                return logger.debug("karma is only exchanged between members of the guild.")
 
         if member_giving.id == member_receiving.id:
             return logger.debug("member cannot give themselves karma.")
@@ -289,9 +779,16 @@ class Karma(commands.Cog):
         if member_receiving.bot:
             return logger.debug("bot may not receive karma.")
 
-        modifier = self.properties["karma_per_vote"] * 1 if is_add_action else -1
+        modifier = self.properties["karma_per_vote"] * (1 if is_add_action else -1)
 
         await self.modify_karma(member_giving, member_receiving, modifier)
+
+        if not isinstance(payload, dict):
+            self.record_unscanned_karma(payload.channel_id, payload.message_id, member_giving, member_receiving, modifier)
+            self.event_log.append(
+                member_giving.id, member_receiving.id, payload.message_id, time.time(),
+                KarmaEventLog.ADDED if is_add_action else KarmaEventLog.REMOVED
+            )
         
     async def modify_karma(self, member_giving, member_receiving, modifier):
         """
@@ -302,9 +799,312 @@ class Karma(commands.Cog):
         await self.update_karma_category(member_receiving, self.karma_roles["thanked"]["name"], modifier)
 
         msg = f"{member_giving.name} { 'added' if modifier > 0 else 'removed'} an endorsement { 'to' if modifier > 0 else ' from '} {member_receiving.name}"
-        await self.properties["channels"].log.send(msg)
+        self.properties["channels"].log_sink.write(msg)
         logger.debug(msg)
                 
+    def tally_endorsement(self, tally: dict, member_giving, member_receiving, day: int):
+        """
+        Counts an endorsement made on 'day' in 'tally' using the same rules as a live reaction.
+        Returns False if the endorsement doesn't earn karma.
+        """
+        if member_giving.id == member_receiving.id:
+            return False
+
+        if member_receiving.bot:
+            return False
+
+        self.tally_karma(tally, member_giving.id, member_receiving.id, day, self.properties["karma_per_vote"])
+        return True
+
+    def tally_karma(self, tally: dict, giver_id: int, receiver_id: int, day: int, amount: int):
+        """
+        Adds 'amount' of karma earned on 'day' to both members in 'tally'.
+        """
+        for member_id, category in (
+            (giver_id, self.karma_roles["thanking"]["name"]),
+            (receiver_id, self.karma_roles["thanked"]["name"])
+        ):
+            days = tally.setdefault(member_id, {}).setdefault(category, {})
+            days[day] = days.get(day, 0) + amount
+
+    def merge_tally(self, tally: dict, other: dict, *, sign: int = 1):
+        """
+        Adds the member id -> karma category -> day -> amount counts in 'other' to 'tally'.
+        """
+        for member_id, counts in other.items():
+            member_counts = tally.setdefault(member_id, {})
+            for category, days in counts.items():
+                if isinstance(days, int):
+                    # recorded before karma was kept by day
+                    days = {self.day_number(datetime.utcnow()): days}
+                tally_days = member_counts.setdefault(category, {})
+                for day, amount in days.items():
+                    tally_days[int(day)] = tally_days.get(int(day), 0) + sign * amount
+
+    def record_unscanned_karma(self, channel_id: int, message_id: int, member_giving, member_receiving, modifier: int):
+        """
+        Remembers karma given live on a message that the next incremental sync will scan.
+        It is written to Config along with the buffered karma.
+        """
+        self._event_count += 1
+        if not self._watermarks and not self._full_sync_running:
+            # karma has never been synced, so the next sync is a full rebuild anyway
+            return
+        if message_id <= self._watermarks.get(str(channel_id), 0):
+            return
+
+        # kept under the day the sync will file the message's karma under
+        day = self.day_number(discord.utils.snowflake_time(message_id))
+        messages = self._unscanned.setdefault(str(channel_id), {})
+        messages.setdefault(str(message_id), []).append(
+            (member_giving.id, member_receiving.id, day, modifier, self._event_count)
+        )
+        self._unscanned_dirty = True
+
+    def settle_unscanned_karma(self, tally: dict, channel_id: int, newest: int, seen: dict):
+        """
+        Takes the live karma on a channel's scanned messages out of 'tally' and forgets it.
+
+        Live karma recorded before sync read a message is in both the members' scores
+        and the scan, so it is subtracted. Live karma recorded after is only in the
+        scores and is left there. Messages newer than 'newest' are kept for the next sync.
+        seen: message id -> number of live endorsements recorded when the scan read it.
+        """
+        messages = self._unscanned.get(str(channel_id), {})
+        for message_id in [message_id for message_id in messages if int(message_id) <= newest]:
+            entries = messages.pop(message_id)
+            read_at = seen.get(int(message_id))
+            if read_at is None:
+                # the scan never read the message while it had live karma, so none was counted twice
+                continue
+            for giver_id, receiver_id, day, amount, event in entries:
+                if event <= read_at:
+                    self.tally_karma(tally, giver_id, receiver_id, day, -amount)
+
+        if not messages:
+            self._unscanned.pop(str(channel_id), None)
+        self._unscanned_dirty = True
+
+    async def commit_tally(self, guild: discord.Guild, tally: dict):
+        """
+        Adds the tallied karma to the members' records in a single write to the karma store.
+        """
+        if not tally:
+            return
+
+        async with self._karma_lock:
+            # buffered records have to land first or they would overwrite the tally
+            await self._flush_karma()
+            data = await self.store.load_all()
+            records = {}
+            today = self.day_number(datetime.utcnow())
+            for member_id, counts in tally.items():
+                record = records[member_id] = data.get(member_id) or copy.deepcopy(self.default_member)
+                for category_id, days in counts.items():
+                    amount = sum(days.values())
+                    thank_category = record.setdefault(category_id, {"total": 0, "current": 0})
+                    thank_category["total"] = self.nonnegative(thank_category.get("total", 0) + amount)
+                    thank_category["current"] = self.nonnegative(thank_category.get("current", 0) + amount)
+
+                    self.advance_window(thank_category, today)
+                    for day, day_amount in days.items():
+                        self.add_to_window(thank_category, day, day_amount)
+                self._update_leaderboards(member_id, record)
+            await self.store.save(records)
+
+    def _update_leaderboards(self, member_id: int, record: dict):
+        """
+        Moves the member to their place on each leaderboard according to their karma record.
+        """
+        for (category_id, field), leaderboard in self.leaderboards.items():
+            leaderboard.update(member_id, self.nonnegative(record.get(category_id, {}).get(field, 0)))
+
+    def open_store(self, backend: str):
+        """
+        Returns the karma store for 'backend', "config" or "sqlite".
+        """
+        if backend == SQLiteKarmaStore.name:
+            return SQLiteKarmaStore(cog_data_path(self) / "karma.sqlite3", self.guild_id, self.default_member)
+        return ConfigKarmaStore(self.db, self.guild_id)
+
+    async def _flush_loop(self):
+        """
+        Writes the buffered karma to the karma store every `flush_interval` seconds.
+        """
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush_karma()
+            except Exception:
+                logger.exception("Flushing buffered karma failed.")
+
+    async def flush_karma(self):
+        """
+        Writes every buffered karma record to the karma store in one write.
+        """
+        async with self._karma_lock:
+            await self._flush_karma()
+
+    async def _flush_karma(self):
+        """
+        Writes the buffered karma records. The caller must hold the karma lock.
+        """
+        if self._unscanned_dirty:
+            self._unscanned_dirty = False
+            await self.db.guild(discord.Object(id=self.guild_id)).unscanned_karma.set({
+                channel_id: {
+                    message_id: [list(entry[:4]) for entry in entries]
+                    for message_id, entries in messages.items()
+                }
+                for channel_id, messages in self._unscanned.items()
+            })
+
+        if not self._karma_buffer:
+            return
+
+        await self.store.save(self._karma_buffer)
+
+        logger.debug(f"Flushed buffered karma for {len(self._karma_buffer)} members.")
+        self._karma_buffer.clear()
+
+    async def get_karma(self, member: discord.Member, category_id: str):
+        """
+        Returns the member's karma for a category, including changes that haven't been written yet.
+        """
+        record = self._karma_buffer.get(member.id)
+        if record is not None:
+            return dict(record[category_id])
+        return (await self.store.load(member.id))[category_id]
+
+    def cog_unload(self):
+        self._flush_task.cancel()
+        self._rollover_task.cancel()
+        asyncio.create_task(self._unload_store())
+        asyncio.create_task(self.properties["channels"].log_sink.close())
+        self.event_log.close()
+
+    async def _unload_store(self):
+        """
+        Writes the buffered karma and then closes the karma store.
+        """
+        try:
+            await self.flush_karma()
+        finally:
+            await self.store.close()
+
+    def day_number(self, moment: datetime):
+        """
+        Returns the number of whole days between the epoch and a naive UTC datetime.
+        """
+        return (moment - datetime(1970, 1, 1)).days
+
+    def advance_window(self, thank_category: dict, today: int):
+        """
+        Moves a karma category's ring of daily buckets forward to 'today'.
+        Days leaving a window are taken off that window's running sum.
+        """
+        days = thank_category.get("days")
+        last_day = thank_category.get("day")
+        if not days or len(days) != self.karma_window_days or last_day is None \
+                or today - last_day >= self.karma_window_days:
+            # nothing in the ring is recent enough to keep
+            thank_category["day"] = today
+            thank_category["days"] = [0] * self.karma_window_days
+            for window in self.karma_windows:
+                thank_category[window] = 0
+            return
+
+        for day in range(last_day + 1, today + 1):
+            for window, length in self.karma_windows.items():
+                thank_category[window] -= days[(day - length) % self.karma_window_days]
+            days[day % self.karma_window_days] = 0
+        thank_category["day"] = max(last_day, today)
+
+    def add_to_window(self, thank_category: dict, day: int, amount: int):
+        """
+        Adds karma earned on 'day' to a category's daily buckets and every window it falls in.
+        The ring must already be advanced to the current day.
+        """
+        age = thank_category["day"] - day
+        if age < 0 or age >= self.karma_window_days:
+            return
+        thank_category["days"][day % self.karma_window_days] += amount
+        for window, length in self.karma_windows.items():
+            if age < length:
+                thank_category[window] += amount
+
+    def timestamp(self, moment: datetime):
+        """
+        Returns the unix timestamp of a naive UTC datetime.
+        """
+        return (moment - datetime(1970, 1, 1)).total_seconds()
+
+    def term_start_day(self, semester_starts, today: int):
+        """
+        Returns the day number the current term started on, or NoneType if no start date is set.
+        """
+        for day in range(today, today - 367, -1):
+            if (datetime(1970, 1, 1) + timedelta(days=day)).strftime("%m-%d") in semester_starts:
+                return day
+        return None
+
+    async def _rollover_loop(self):
+        """
+        Rolls the karma windows over and compacts the event log shortly after midnight UTC every day.
+        """
+        await self.bot.wait_until_ready()
+        while True:
+            try:
+                await self.rollover_karma()
+            except Exception:
+                logger.exception("Rolling over karma failed.")
+            try:
+                await self.event_log.compact()
+            except Exception:
+                logger.exception("Compacting the karma event log failed.")
+            now = datetime.utcnow()
+            midnight = datetime.combine(now.date() + timedelta(days=1), datetime.min.time())
+            await asyncio.sleep((midnight - now).total_seconds() + 60)
+
+    async def rollover_karma(self):
+        """
+        Moves every member's daily buckets forward to today in one write.
+
+        If a semester start date has passed since the last rollover, everyone's
+        current karma goes back to zero as well.
+        """
+        guild = self.bot.get_guild(self.guild_id)
+        if guild is None:
+            return
+
+        today = self.day_number(datetime.utcnow())
+        last_rollover = await self.db.guild(guild).last_rollover()
+        semester_starts = await self.db.guild(guild).semester_starts()
+
+        new_term = last_rollover is not None and any(
+            (datetime(1970, 1, 1) + timedelta(days=day)).strftime("%m-%d") in semester_starts
+            for day in range(last_rollover + 1, today + 1)
+        )
+
+        async with self._karma_lock:
+            await self._flush_karma()
+            data = await self.store.load_all()
+            for member_id, record in data.items():
+                for category in self.karma_roles.values():
+                    thank_category = record.get(category["name"])
+                    if thank_category is None:
+                        continue
+                    self.advance_window(thank_category, today)
+                    if new_term:
+                        thank_category["current"] = 0
+                self._update_leaderboards(member_id, record)
+            await self.store.save(data)
+            await self.db.guild(guild).last_rollover.set(today)
+
+        if new_term:
+            logger.info("A new term has started, current karma was reset.")
+            await self.properties["channels"].log.send("A new term has started. Current karma has been reset.")
+
     def nonnegative(self, val: int):
         """
         Returns either the `val` or zero.
@@ -316,15 +1116,28 @@ class Karma(commands.Cog):
         Applies the modifier to the user's thanked score.
         """
         try:
-            thank_category = await self.db.member(member).get_raw(category_id)
+            async with self._karma_lock:
+                # the member's record is read once and then kept in the write-behind buffer
+                record = self._karma_buffer.get(member.id)
+                if record is None:
+                    record = self._karma_buffer[member.id] = await self.store.load(member.id)
 
-            thank_category["total"] = self.nonnegative(
-                thank_category["total"] + modifier
-            )
-            thank_category["current"] = self.nonnegative(
-                thank_category["current"] + modifier
-            )
-
-            await self.db.member(member).set_raw(category_id, value=thank_category)
+                self.apply_karma(record, category_id, modifier, self.day_number(datetime.utcnow()))
+                self._update_leaderboards(member.id, record)
         except KeyError:
-            logger.exception("Member doesn't exist.")
\ No newline at end of file
+            logger.exception("Member doesn't exist.")
+
+    def apply_karma(self, record: dict, category_id: str, modifier: int, today: int):
+        """
+        Applies the modifier to one category of a member's karma record, as earned on 'today'.
+        """
+        # clamped one change at a time, exactly as if each were written straight away
+        thank_category = record[category_id]
+        self.advance_window(thank_category, today)
+        self.add_to_window(thank_category, today, modifier)
+        thank_category["total"] = self.nonnegative(
+            thank_category["total"] + modifier
+        )
+        thank_category["current"] = self.nonnegative(
+            thank_category["current"] + modifier
+        )
\ No newline at end of file
@@ -0,0 +1,109 @@
+import asyncio
+import os
+import struct
+
+from .logger import logger
+
+
+class KarmaEventLog:
+    """
+    An append-only file of every endorsement the karma cog has seen.
+
+    Each event is a fixed-size record of giver id, receiver id, message id,
+    unix timestamp and kind. `ADDED` and `REMOVED` come from live reactions,
+    `SEEN` from sync finding the reaction in the message history. Replaying
+    the log in order gives whether each (giver, receiver, message) endorsement
+    currently stands, without asking Discord.
+    """
+    ADDED = 1
+    REMOVED = -1
+    SEEN = 0
+
+    record = struct.Struct("<QQQIb")
+
+    def __init__(self, path):
+        self.path = str(path)
+        self._file = open(self.path, "ab")
+        self._compacting = False
+        self._pending = []
+
+    def append(self, giver_id: int, receiver_id: int, message_id: int, timestamp: float, kind: int):
+        """
+        Adds an event to the end of the log.
+        """
+        packed = self.record.pack(giver_id, receiver_id, message_id, int(timestamp), kind)
+        if self._compacting:
+            # written once the compacted file is in place
+            self._pending.append(packed)
+            return
+        self._file.write(packed)
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+    def clear(self):
+        """
+        Empties the log.
+        """
+        self._file.close()
+        self._file = open(self.path, "wb")
+        self._pending.clear()
+
+    def _read(self):
+        """
+        Returns every complete event in the log, oldest first.
+        """
+        size = os.path.getsize(self.path)
+        # a record being written right now is left for next time
+        size -= size % self.record.size
+        with open(self.path, "rb") as log:
+            data = log.read(size)
+        return list(self.record.iter_unpack(data))
+
+    def _replay(self):
+        """
+        Returns (giver, receiver, message) -> timestamp for every endorsement that currently stands.
+        """
+        standing = {}
+        for giver_id, receiver_id, message_id, timestamp, kind in self._read():
+            key = (giver_id, receiver_id, message_id)
+            if kind == self.REMOVED:
+                standing.pop(key, None)
+            elif kind == self.ADDED or key not in standing:
+                standing[key] = timestamp
+        return standing
+
+    async def standing(self):
+        """
+        Replays the log away from the event loop and returns the endorsements that currently stand.
+        """
+        return await asyncio.get_event_loop().run_in_executor(None, self._replay)
+
+    def _rewrite(self):
+        standing = self._replay()
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, "wb") as log:
+            for (giver_id, receiver_id, message_id), timestamp in standing.items():
+                log.write(self.record.pack(giver_id, receiver_id, message_id, timestamp, self.ADDED))
+        os.replace(temp_path, self.path)
+        return len(standing)
+
+    async def compact(self):
+        """
+        Rewrites the log as a single event per endorsement that still stands.
+        """
+        if self._compacting:
+            return
+        self._compacting = True
+        self._file.close()
+        try:
+            kept = await asyncio.get_event_loop().run_in_executor(None, self._rewrite)
+            logger.info(f"Compacted the karma event log to {kept} endorsements.")
+        finally:
+            self._file = open(self.path, "ab")
+            self._compacting = False
+            for packed in self._pending:
+                self._file.write(packed)
+            self._file.flush()
+            self._pending.clear()
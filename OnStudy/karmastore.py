@@ -0,0 +1,247 @@
+import asyncio
+import copy
+import sqlite3
+
+from concurrent.futures import ThreadPoolExecutor
+
+from .bulkconfig import member_group, update_members
+
+
+class ConfigKarmaStore:
+    """
+    Keeps member karma records in Red's Config, one JSON record per member.
+    """
+    name = "config"
+
+    def __init__(self, config, guild_id: int):
+        self.config = config
+        self.guild_id = guild_id
+
+    def _members(self):
+        return member_group(self.config, self.guild_id)
+
+    async def load(self, member_id: int):
+        """
+        Returns the member's karma record, filled in with the defaults.
+        """
+        return await self.config.member_from_ids(self.guild_id, member_id).all()
+
+    async def load_category(self, member_id: int, category_id: str):
+        """
+        Returns one category of the member's karma record.
+        """
+        return await self.config.member_from_ids(self.guild_id, member_id).get_raw(category_id)
+
+    async def save_category(self, member_id: int, category_id: str, thank_category: dict):
+        """
+        Writes one category of the member's karma record.
+        """
+        await self.config.member_from_ids(self.guild_id, member_id).set_raw(category_id, value=thank_category)
+
+    async def load_all(self):
+        """
+        Returns member id -> karma record for every member with stored karma.
+        """
+        data = await self._members()()
+        return {int(member_id): record for member_id, record in data.items()}
+
+    async def save(self, records: dict):
+        """
+        Writes the member id -> karma record pairs in 'records' in one write.
+        """
+        await update_members(self.config, self.guild_id, records)
+
+    async def replace_all(self, records: dict):
+        """
+        Replaces every stored record with 'records'.
+        """
+        await self._members().set({str(member_id): record for member_id, record in records.items()})
+
+    async def clear(self):
+        await self._members().clear()
+
+    async def top(self, category_id: str, field: str, n: int):
+        """
+        Returns the `n` members with the highest 'field' in 'category_id' as (member id, score) pairs.
+        """
+        scores = [
+            (member_id, record.get(category_id, {}).get(field, 0))
+            for member_id, record in (await self.load_all()).items()
+        ]
+        scores = [(member_id, score) for member_id, score in scores if score > 0]
+        scores.sort(key=lambda entry: (-entry[1], entry[0]))
+        return scores[:n]
+
+    async def close(self):
+        pass
+
+
+class SQLiteKarmaStore:
+    """
+    Keeps member karma records in a SQLite database, one row per member and karma category.
+
+    Rows are keyed by guild, member and category, and each score has an index so that
+    top-N queries read only the rows they return. All database work happens on a
+    single background thread so the event loop never waits on the disk.
+    """
+    name = "sqlite"
+    fields = ("total", "current", "week", "month")
+
+    schema = """
+        CREATE TABLE IF NOT EXISTS karma (
+            guild_id INTEGER NOT NULL,
+            member_id INTEGER NOT NULL,
+            category TEXT NOT NULL,
+            total INTEGER NOT NULL DEFAULT 0,
+            current INTEGER NOT NULL DEFAULT 0,
+            week INTEGER NOT NULL DEFAULT 0,
+            month INTEGER NOT NULL DEFAULT 0,
+            day INTEGER,
+            days TEXT NOT NULL DEFAULT '',
+            PRIMARY KEY (guild_id, member_id, category)
+        );
+        CREATE INDEX IF NOT EXISTS karma_total ON karma (guild_id, category, total DESC);
+        CREATE INDEX IF NOT EXISTS karma_current ON karma (guild_id, category, current DESC);
+        CREATE INDEX IF NOT EXISTS karma_week ON karma (guild_id, category, week DESC);
+        CREATE INDEX IF NOT EXISTS karma_month ON karma (guild_id, category, month DESC);
+    """
+
+    # the same statement text is reused so sqlite3 keeps each one prepared
+    select_member = (
+        "SELECT category, total, current, week, month, day, days FROM karma "
+        "WHERE guild_id = ? AND member_id = ?"
+    )
+    select_category = (
+        "SELECT total, current, week, month, day, days FROM karma "
+        "WHERE guild_id = ? AND member_id = ? AND category = ?"
+    )
+    select_all = (
+        "SELECT member_id, category, total, current, week, month, day, days FROM karma "
+        "WHERE guild_id = ?"
+    )
+    upsert = (
+        "INSERT OR REPLACE INTO karma (guild_id, member_id, category, total, current, week, month, day, days) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"
+    )
+    delete_guild = "DELETE FROM karma WHERE guild_id = ?"
+
+    def __init__(self, path, guild_id: int, defaults: dict):
+        self.guild_id = guild_id
+        self.defaults = defaults
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._connection = sqlite3.connect(str(path), check_same_thread=False)
+        self._connection.executescript(self.schema)
+
+    async def _run(self, func, *args):
+        return await asyncio.get_event_loop().run_in_executor(self._executor, func, *args)
+
+    def _category(self, total, current, week, month, day, days):
+        return {
+            "total": total,
+            "current": current,
+            "week": week,
+            "month": month,
+            "day": day,
+            "days": [int(amount) for amount in days.split(",")] if days else []
+        }
+
+    def _rows(self, member_id: int, record: dict):
+        for category_id, thank_category in record.items():
+            yield (
+                self.guild_id, member_id, category_id,
+                *(thank_category.get(field, 0) for field in self.fields),
+                thank_category.get("day"),
+                ",".join(str(amount) for amount in thank_category.get("days", []))
+            )
+
+    def _load(self, member_id: int):
+        record = copy.deepcopy(self.defaults)
+        for category_id, *values in self._connection.execute(self.select_member, (self.guild_id, member_id)):
+            record[category_id] = self._category(*values)
+        return record
+
+    def _load_category(self, member_id: int, category_id: str):
+        row = self._connection.execute(self.select_category, (self.guild_id, member_id, category_id)).fetchone()
+        if row is None:
+            return copy.deepcopy(self.defaults[category_id])
+        return self._category(*row)
+
+    def _load_all(self):
+        records = {}
+        for member_id, category_id, *values in self._connection.execute(self.select_all, (self.guild_id,)):
+            record = records.setdefault(member_id, copy.deepcopy(self.defaults))
+            record[category_id] = self._category(*values)
+        return records
+
+    def _save(self, records: dict, replace: bool = False):
+        # one transaction for the whole batch
+        with self._connection:
+            if replace:
+                self._connection.execute(self.delete_guild, (self.guild_id,))
+            self._connection.executemany(
+                self.upsert,
+                [row for member_id, record in records.items() for row in self._rows(int(member_id), record)]
+            )
+
+    def _clear(self):
+        with self._connection:
+            self._connection.execute(self.delete_guild, (self.guild_id,))
+
+    def _top(self, category_id: str, field: str, n: int):
+        if field not in self.fields:
+            raise ValueError(f"{field} is not a karma score.")
+        query = (
+            f"SELECT member_id, {field} FROM karma WHERE guild_id = ? AND category = ? AND {field} > 0 "
+            f"ORDER BY {field} DESC, member_id LIMIT ?"
+        )
+        return list(self._connection.execute(query, (self.guild_id, category_id, n)))
+
+    async def load(self, member_id: int):
+        """
+        Returns the member's karma record, filled in with the defaults.
+        """
+        return await self._run(self._load, member_id)
+
+    async def load_category(self, member_id: int, category_id: str):
+        """
+        Returns one category of the member's karma record.
+        """
+        return await self._run(self._load_category, member_id, category_id)
+
+    async def save_category(self, member_id: int, category_id: str, thank_category: dict):
+        """
+        Writes one category of the member's karma record.
+        """
+        await self.save({member_id: {category_id: thank_category}})
+
+    async def load_all(self):
+        """
+        Returns member id -> karma record for every member with stored karma.
+        """
+        return await self._run(self._load_all)
+
+    async def save(self, records: dict):
+        """
+        Writes the member id -> karma record pairs in 'records' in one transaction.
+        """
+        if records:
+            await self._run(self._save, records)
+
+    async def replace_all(self, records: dict):
+        """
+        Replaces every stored record with 'records'.
+        """
+        await self._run(self._save, records, True)
+
+    async def clear(self):
+        await self._run(self._clear)
+
+    async def top(self, category_id: str, field: str, n: int):
+        """
+        Returns the `n` members with the highest 'field' in 'category_id' as (member id, score) pairs.
+        """
+        return await self._run(self._top, category_id, field, n)
+
+    async def close(self):
+        await self._run(self._connection.close)
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,48 @@
+import bisect
+
+
+class Leaderboard:
+    """
+    Keeps members ordered by score so the top of the board can be read without sorting.
+
+    Entries are kept as (-score, member id) in a sorted list, so the highest
+    score comes first and ties are broken by member id.
+    """
+
+    def __init__(self):
+        self._entries = []
+        self._scores = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def update(self, member_id: int, score: int):
+        """
+        Sets the member's score, moving them to their new place on the board.
+        Members with a score of zero are left off the board.
+        """
+        old_score = self._scores.get(member_id)
+        if old_score == score:
+            return
+
+        if old_score is not None:
+            index = bisect.bisect_left(self._entries, (-old_score, member_id))
+            del self._entries[index]
+            del self._scores[member_id]
+
+        if score:
+            bisect.insort(self._entries, (-score, member_id))
+            self._scores[member_id] = score
+
+    def top(self, n: int):
+        """
+        Returns the `n` highest scoring members as (member id, score) pairs.
+        """
+        return [(member_id, -score) for score, member_id in self._entries[:n]]
+
+    def clear(self):
+        """
+        Removes everyone from the board.
+        """
+        self._entries.clear()
+        self._scores.clear()
@@ -0,0 +1,113 @@
+import asyncio
+import discord
+
+from .logger import logger
+
+
+class LogSink:
+    """
+    Gathers lines meant for a log channel and posts them as a few packed messages.
+
+    Lines are posted once enough have queued to fill a message, or `flush_interval`
+    seconds after the first of them was written, whichever comes first. Writing never
+    waits on Discord. Once `max_pending` lines are waiting, further lines are dropped
+    and the next post says how many were lost.
+    """
+    message_limit = 2000
+
+    def __init__(self, get_channel, *, flush_interval: float = 5.0, max_pending: int = 500):
+        """
+        get_channel: function returning the channel to post to, called on every flush.
+        """
+        self.get_channel = get_channel
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.dropped = 0
+        self._lines = []
+        self._size = 0
+        self._wake = asyncio.Event()
+        self._full = asyncio.Event()
+        self._task = None
+
+    def write(self, line: str):
+        """
+        Queues a line for the log channel.
+        """
+        if len(self._lines) >= self.max_pending:
+            self.dropped += 1
+            return
+
+        self._lines.append(line)
+        self._size += len(line) + 1
+        self._wake.set()
+        if self._size >= self.message_limit:
+            self._full.set()
+
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        """
+        Posts the queued lines whenever a message fills up or the interval runs out.
+        """
+        while True:
+            await self._wake.wait()
+            try:
+                await asyncio.wait_for(self._full.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            await self.flush()
+
+    def _pack(self, lines):
+        """
+        Joins the lines into as few messages as fit in Discord's message limit.
+        """
+        messages = []
+        current = ""
+        for line in lines:
+            # a single line longer than a message is cut into pieces
+            while len(line) > self.message_limit:
+                if current:
+                    messages.append(current)
+                    current = ""
+                messages.append(line[:self.message_limit])
+                line = line[self.message_limit:]
+            if current and len(current) + 1 + len(line) > self.message_limit:
+                messages.append(current)
+                current = ""
+            current = f"{current}\n{line}" if current else line
+        if current:
+            messages.append(current)
+        return messages
+
+    async def flush(self):
+        """
+        Posts everything queued so far.
+        """
+        lines, self._lines, self._size = self._lines, [], 0
+        self._wake.clear()
+        self._full.clear()
+        if self.dropped:
+            lines.append(f"... {self.dropped} more log line{'s' if self.dropped != 1 else ''} dropped.")
+            self.dropped = 0
+        if not lines:
+            return
+
+        channel = self.get_channel()
+        if channel is None:
+            return logger.error(f"Log channel not found, {len(lines)} log lines lost.")
+
+        for message in self._pack(lines):
+            try:
+                await channel.send(message)
+            except discord.HTTPException as e:
+                logger.error(f"Posting to the log channel failed: {e}")
+
+    async def close(self):
+        """
+        Stops the background poster and posts whatever is still queued.
+        """
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await self.flush()
@@ -1,4 +1,5 @@
 from redbot.core import commands
+from .logsink import LogSink
 
 
 class OSChannels(commands.Cog):
@@ -25,6 +26,9 @@ class OSChannels(commands.Cog):
         self.__channel_newMembers = None
         self.__channel_welcome = None
 
+        # busy code paths post to the log channel through this so their lines are packed together
+        self.log_sink = LogSink(lambda: self.log)
+
     @property
     def courseList(self):
         """
@@ -1,10 +1,14 @@
 from redbot.core import commands
 from .logger import logger
 
+import asyncio
 import discord
 import random
 
 class RoleHandler(commands.Cog):
+    # seconds that toggles of the same role by the same member are gathered before acting
+    debounce_seconds = 2.0
+
     def __init__(self, bot, args):
         """
         Initialize the CourseAssignment object
@@ -13,6 +17,18 @@ class RoleHandler(commands.Cog):
         self.logic = args["logic"]
         self.channels = args["channels"]    
 
+        # (member id, role id) -> the latest requested state of that role
+        self._pending_updates = {}
+        self.collapsed_events = 0
+        # debounce tasks still waiting or running, so they can be cancelled on unload
+        self._update_tasks = set()
+
+    def cog_unload(self):
+        for task in self._update_tasks:
+            task.cancel()
+        self._update_tasks.clear()
+        self._pending_updates.clear()
+
     def getRolesForUser(self, user: discord.Member = None):
         """
         Gets a list of the roles assigned to the user,
@@ -31,19 +47,27 @@ class RoleHandler(commands.Cog):
         """
         createRole = await self.logic.confirm(ctx, msg=f"Role `{role_name}` does not exist. Would you like to create it?")
         if (createRole):
-            color = self.get_role_color()
-            try:
-                # create the role in the guild
-                role_obj = await ctx.guild.create_role(name=role_name, color=color)
-            except discord.InvalidArgument:
-                logger.exception("InvalidArgument")
-            except discord.Forbidden:
-                logger.exception(f"Bot lacks permission to add roles to the server.")
-            except discord.HTTPException:
-                logger.exception(f"Creating the role failed.")
-            else:
-                logger.info(f"Creating role for {role_name}.")
-                return role_obj
+            return await self.make_role(ctx.guild, role_name)
+        return None
+
+    async def make_role(self, guild: discord.Guild, role_name: str):
+        """
+        Creates the role in the guild without asking for confirmation.
+        Returns the new role, or NoneType if it couldn't be created.
+        """
+        color = self.get_role_color()
+        try:
+            # create the role in the guild
+            role_obj = await guild.create_role(name=role_name, color=color)
+        except discord.InvalidArgument:
+            logger.exception("InvalidArgument")
+        except discord.Forbidden:
+            logger.exception(f"Bot lacks permission to add roles to the server.")
+        except discord.HTTPException:
+            logger.exception(f"Creating the role failed.")
+        else:
+            logger.info(f"Creating role for {role_name}.")
+            return role_obj
         return None
 
     def get_role_color(self):
@@ -64,7 +88,55 @@ class RoleHandler(commands.Cog):
 
         return color
 
-    async def update_member(self, member: discord.Member, role: discord.Role, add: bool):
+    def queue_member_update(self, member: discord.Member, role: discord.Role, add: bool):
+        """
+        Schedules adding or removing a role from member after a short debounce window.
+
+        Further toggles of the same role by the same member within the window only
+        change the final state, so a burst of clicks costs at most one API call.
+        """
+        key = (member.id, role.id)
+        pending = self._pending_updates.get(key)
+        if pending is not None:
+            pending["add"] = add
+            pending["events"] += 1
+            return
+
+        self._pending_updates[key] = {"member": member, "role": role, "add": add, "events": 1}
+        task = asyncio.create_task(self._apply_member_update(key))
+        self._update_tasks.add(task)
+        task.add_done_callback(self._update_done)
+
+    def _update_done(self, task):
+        """
+        Forgets a finished debounce task, logging whatever error stopped it
+        """
+        self._update_tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("Applying a debounced role update failed.", exc_info=task.exception())
+
+    async def _apply_member_update(self, key):
+        """
+        Applies the final state of a debounced role toggle
+        """
+        await asyncio.sleep(self.debounce_seconds)
+        pending = self._pending_updates.pop(key)
+        member, role, add = pending["member"], pending["role"], pending["add"]
+
+        collapsed = pending["events"] - 1
+        self.collapsed_events += collapsed
+
+        if (role in member.roles) == add:
+            return logger.debug(
+                f"Collapsed {pending['events']} toggle(s) of `{role.name}` by `{member.name}` into no change."
+            )
+
+        try:
+            await self.update_member(member, role, add, collapsed=collapsed)
+        except discord.HTTPException:
+            logger.exception(f"Updating role `{role.name}` for member `{member.name}` failed.")
+
+    async def update_member(self, member: discord.Member, role: discord.Role, add: bool, *, collapsed: int = 0):
         """
         Adds or removes a role from mbember
         """
@@ -81,6 +153,8 @@ class RoleHandler(commands.Cog):
         debug_msg = (
             f"{'Added' if add else 'Removed'} role: `{role.name}` to member: `{member.name}`"
         )
+        if collapsed:
+            debug_msg += f" (collapsed {collapsed} earlier toggle{'s' if collapsed != 1 else ''}, {self.collapsed_events} in total)"
         logger.debug(debug_msg)
-        await self.channels.log.send(debug_msg)
+        self.channels.log_sink.write(debug_msg)
         
\ No newline at end of file
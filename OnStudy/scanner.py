@@ -0,0 +1,117 @@
+import asyncio
+import time
+
+from .throttle import run_bounded
+
+
+class HistoryScanner:
+    """
+    Walks the message history of several channels at once.
+
+    Each channel is read by a producer which keeps up to `prefetch` pages of
+    messages queued ahead of the code handling them, so the next history page
+    is being fetched while the current one is processed. Every history page and
+    reaction lookup spends from the shared `bucket`.
+    """
+    page_size = 100
+
+    def __init__(self, bucket, *, workers: int = 4, prefetch: int = 1):
+        self.bucket = bucket
+        self.workers = workers
+        self.prefetch = prefetch
+        self.messages = 0
+        self.started = None
+
+    @property
+    def elapsed(self):
+        """
+        Seconds since the scan started
+        """
+        if self.started is None:
+            return 0.0
+        return time.monotonic() - self.started
+
+    @property
+    def rate(self):
+        """
+        Messages handled per second so far
+        """
+        elapsed = self.elapsed
+        return self.messages / elapsed if elapsed > 0 else 0.0
+
+    async def reaction_users(self, reaction):
+        """
+        Returns the users who added 'reaction', paying for the lookup from the shared budget.
+        """
+        await self.bucket.acquire()
+        return [user async for user in reaction.users()]
+
+    async def _read_pages(self, channel, queue, history_kwargs):
+        """
+        Reads the channel's history into 'queue' one page at a time. NoneType marks the end.
+        """
+        try:
+            page = []
+            await self.bucket.acquire()
+            async for message in channel.history(**history_kwargs):
+                page.append(message)
+                if len(page) == self.page_size:
+                    await queue.put(page)
+                    page = []
+                    # the iterator fetches the next page as soon as we continue
+                    await self.bucket.acquire()
+            if page:
+                await queue.put(page)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # let the consumer stop so that the error can be raised to it
+            await queue.put(None)
+            raise
+        await queue.put(None)
+
+    async def scan_channel(self, channel, handle_message, **history_kwargs):
+        """
+        Calls 'handle_message(channel, message)' for every message in the channel's history.
+        Returns the number of messages handled.
+        """
+        queue = asyncio.Queue(maxsize=self.prefetch)
+        reader = asyncio.create_task(self._read_pages(channel, queue, history_kwargs))
+        handled = 0
+        try:
+            while True:
+                page = await queue.get()
+                if page is None:
+                    break
+                for message in page:
+                    await handle_message(channel, message)
+                    handled += 1
+                    self.messages += 1
+        except BaseException:
+            reader.cancel()
+            raise
+
+        # surfaces any error raised while reading the history
+        await reader
+        return handled
+
+    async def scan(self, channels, handle_message, *, on_channel_done=None, history=None):
+        """
+        Scans every channel in 'channels' with no more than 'workers' channels in flight.
+
+        history: optional function returning the `channel.history` keyword arguments for a channel.
+        on_channel_done: optional coroutine function called with the channel and its message count.
+        Returns the result of each channel's scan, or the exception that stopped it.
+        """
+        self.started = time.monotonic()
+
+        def build_job(channel):
+            async def job():
+                history_kwargs = history(channel) if history is not None else {"limit": None}
+                handled = await self.scan_channel(channel, handle_message, **history_kwargs)
+                if on_channel_done is not None:
+                    await on_channel_done(channel, handled)
+                return handled
+            return job
+
+        return await run_bounded([build_job(channel) for channel in channels], workers=self.workers)
@@ -0,0 +1,56 @@
+import asyncio
+import time
+
+
+class TokenBucket:
+    """
+    A request budget shared by everything that talks to the same Discord route.
+
+    `rate` requests are allowed every `per` seconds, refilled continuously.
+    """
+
+    def __init__(self, rate: int, per: float = 1.0):
+        self.rate = rate
+        self.per = per
+        self._tokens = float(rate)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.rate, self._tokens + (now - self._updated) * self.rate / self.per)
+        self._updated = now
+
+    async def acquire(self):
+        """
+        Waits until a request may be made and then spends a token on it.
+        """
+        async with self._lock:
+            self._refill()
+            while self._tokens < 1:
+                await asyncio.sleep((1 - self._tokens) * self.per / self.rate)
+                self._refill()
+            self._tokens -= 1
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return False
+
+
+async def run_bounded(jobs, *, workers: int):
+    """
+    Runs each coroutine function in `jobs` with no more than `workers` running at once.
+
+    Results come back in the order of `jobs`. A job that raises has its exception
+    returned in its place so that one failure doesn't abandon the rest.
+    """
+    semaphore = asyncio.Semaphore(workers)
+
+    async def run(job):
+        async with semaphore:
+            return await job()
+
+    return await asyncio.gather(*[run(job) for job in jobs], return_exceptions=True)
@@ -1,16 +1,40 @@
-from redbot.core import commands, checks
+from redbot.core import Config, commands, checks
 from redbot.core.utils.chat_formatting import humanize_list
+from .joinburst import JoinAggregator, batch_members
 
+from datetime import datetime
+
+import asyncio
 import discord
 
 class Greet(commands.Cog):
     """My custom cog"""
  
     guild_id = 493875452046475275
+    # joins within this many seconds of each other share one welcome message
+    join_window_seconds = 10
+    # this many joins within join_alert_seconds is reported in the log channel
+    join_alert_count = 15
+    join_alert_seconds = 60
     
     def __init__(self, bot):
         self.bot = bot
         self.channels = self.Channels(bot)   
+        self.db = Config.get_conf(self, identifier=4938754520, force_registration=True)
+        # unix time the most recently greeted member joined at
+        self.db.register_guild(last_greeted_join=None)
+        self.joins = JoinAggregator(
+            self.welcomeJoined,
+            window=self.join_window_seconds,
+            on_alert=self.joinAlert,
+            alert_joins=self.join_alert_count,
+            alert_window=self.join_alert_seconds
+        )
+        self.catchUpTask = asyncio.create_task(self.catchUp())
+
+    def cog_unload(self):
+        self.joins.cancel()
+        self.catchUpTask.cancel()
 
     class Channels:
         """Collection of channels and their ids on the server"""
@@ -24,6 +48,12 @@ class Greet(commands.Cog):
         u18_id = 494210029294059520
         incident_id = 494210087217266688
         welcome_id = 513855964294938624
+        log_id = 509041710651670548
+
+        @property
+        def log(self):
+            """Bot log channel object"""
+            return self.bot.get_channel(self.log_id)
 
         @property
         def newMembers(self):
@@ -60,38 +90,74 @@ class Greet(commands.Cog):
         if member.bot or member.guild.id != self.guild_id:
             # don't greet bots
             return        
-        await self.welcome(self.channels.newMembers, member)
-    
-    async def pastGreet(self, ctx=None):
-        """Greets members that joined the server while the bot was unavailable"""
+        self.joins.add(member)
 
-        recentlyJoinedMembers = []
-        messageLimit = 50
+    async def welcomeJoined(self, members):
+        """Welcomes the members who joined during one join window"""
+        guild = self.bot.get_guild(self.guild_id)
+        # skip anyone who has already left again
+        members = [member for member in members if guild.get_member(member.id) is not None]
+        await self.welcome(self.channels.newMembers, members)
+        await self.markGreeted(guild, members)
 
+    async def joinAlert(self, joins):
+        """Reports that members are joining much faster than usual"""
         log = self.channels.log
-
         if log is None:
             return
+        await log.send(
+            f"{joins} members joined in the last {self.join_alert_seconds} seconds. This could be a raid."
+        )
+    
+    async def pastGreet(self, ctx=None):
+        """Greets members that joined the server while the bot was unavailable"""
+        guild = self.bot.get_guild(self.guild_id)
+        if guild is None:
+            return
+
+        lastGreeted = await self.db.guild(guild).last_greeted_join()
+        if lastGreeted is None:
+            # nothing to compare against yet, so only start counting from now
+            return await self.db.guild(guild).last_greeted_join.set(self.joinTime(datetime.utcnow()))
 
-        # scan through the `messageLimit` most recent messages, add any new member announcment to the list of
-        # `recentlyJoinedMembers` exit as soon as there is message from the bot found
-        async for message in self.channels.newMembers.history(limit=messageLimit):
-            if not message.author.bot:
-                recentlyJoinedMembers.append(message)
-            else:
-                break
+        # everyone who joined after the last member we greeted, however long we were away
+        recentlyJoinedMembers = sorted(
+            (
+                member for member in guild.members
+                if not member.bot and member.joined_at is not None and self.joinTime(member.joined_at) > lastGreeted
+            ),
+            key=lambda member: member.joined_at
+        )
 
         size = len(recentlyJoinedMembers)
-#        await log.send(f"{size} new member{'s' if size > 1 or size == 0 else ''} greeted since I was last online.")
+        log = self.channels.log
+        if log is not None:
+            await log.send(f"{size} new member{'s' if size != 1 else ''} greeted since I was last online.")
 
         # if our list is empty then we don't want to do anything else
         if size == 0:
             return
 
-        members = [message.author for message in recentlyJoinedMembers]
+        # welcome splits the list into as many messages as it needs
+        await self.welcome(self.channels.newMembers, recentlyJoinedMembers)
+        await self.markGreeted(guild, recentlyJoinedMembers)
 
-        #  for message in recentlyJoinedMembers:
-        await self.welcome(self.channels.newMembers, members)
+    async def catchUp(self):
+        """Greets anyone who joined while the bot was offline once the bot is ready"""
+        await self.bot.wait_until_ready()
+        await self.pastGreet()
+
+    def joinTime(self, moment):
+        """Returns the unix timestamp of a naive UTC datetime"""
+        return (moment - datetime(1970, 1, 1)).total_seconds()
+
+    async def markGreeted(self, guild, members):
+        """Moves the last greeted join time up to the latest join among `members`"""
+        joined = [self.joinTime(member.joined_at) for member in members if member.joined_at is not None]
+        if not joined:
+            return
+        lastGreeted = await self.db.guild(guild).last_greeted_join()
+        await self.db.guild(guild).last_greeted_join.set(max(joined + [lastGreeted or 0]))
         
     async def welcome(self, channel=None, members=None):
         """Helper function to handle the welcoming of a user"""
@@ -109,14 +175,19 @@ class Greet(commands.Cog):
         if len(members) == 0:
             return
 
-        mentionList = [member.mention for member in members]
+        def render(batch):
+            mentionList = [member.mention for member in batch]
+
+            # since we have members we now want to start doing work on them
+            greetMembers = humanize_list(mentionList)
 
-        # since we have members we now want to start doing work on them
-        greetMembers = humanize_list(mentionList)
+            return (
+                f"Welcome {greetMembers}!\n"
+                "Please take a moment to check out "
+                f"{self.channels.anchor(self.channels.welcome_id)}.\n"
+                "Following the instructions in there will allow you to gain full access to the server."
+            )
 
-        await channel.send(
-            f"Welcome {greetMembers}!\n"
-            "Please take a moment to check out "
-            f"{self.channels.anchor(self.channels.welcome_id)}.\n"
-            "Following the instructions in there will allow you to gain full access to the server."
-        )
\ No newline at end of file
+        # a big enough group of members won't fit in one message
+        for batch in batch_members(members, render):
+            await channel.send(render(batch))
\ No newline at end of file
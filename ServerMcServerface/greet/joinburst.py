@@ -0,0 +1,86 @@
+import asyncio
+import collections
+import time
+
+
+class JoinAggregator:
+    """
+    Collects members as they join and welcomes them together.
+
+    The first join starts a `window` second timer, everyone who joins before
+    it runs out is passed to 'welcome' in a single call. When `alert_joins`
+    or more members join within `alert_window` seconds, 'on_alert' is called
+    with the number of joins, at most once per `alert_window`.
+    """
+
+    def __init__(self, welcome, *, window: float = 10.0, on_alert=None, alert_joins: int = 15, alert_window: float = 60.0):
+        """
+        welcome: coroutine function called with the list of members who joined in a window.
+        on_alert: optional coroutine function called with the number of recent joins.
+        """
+        self.welcome = welcome
+        self.window = window
+        self.on_alert = on_alert
+        self.alert_joins = alert_joins
+        self.alert_window = alert_window
+        self._pending = []
+        self._timer = None
+        self._recent = collections.deque()
+        self._last_alert = None
+
+    def add(self, member):
+        """
+        Queues a member to be welcomed at the end of the current window.
+        """
+        self._pending.append(member)
+        if self._timer is None or self._timer.done():
+            self._timer = asyncio.create_task(self._welcome_after_window())
+        self._check_rate()
+
+    def _check_rate(self):
+        now = time.monotonic()
+        self._recent.append(now)
+        while self._recent and self._recent[0] <= now - self.alert_window:
+            self._recent.popleft()
+
+        if self.on_alert is None or len(self._recent) < self.alert_joins:
+            return
+        if self._last_alert is not None and now - self._last_alert < self.alert_window:
+            return
+        self._last_alert = now
+        asyncio.create_task(self.on_alert(len(self._recent)))
+
+    async def _welcome_after_window(self):
+        await asyncio.sleep(self.window)
+        await self.flush()
+
+    async def flush(self):
+        """
+        Welcomes everyone queued so far.
+        """
+        members, self._pending = self._pending, []
+        if members:
+            await self.welcome(members)
+
+    def cancel(self):
+        """
+        Stops the timer. Queued members are not welcomed.
+        """
+        if self._timer is not None:
+            self._timer.cancel()
+
+
+def batch_members(members, render, limit: int = 2000):
+    """
+    Splits 'members' into groups whose message, as built by 'render(group)', fits in 'limit' characters.
+    """
+    batches = []
+    batch = []
+    for member in members:
+        if batch and len(render(batch + [member])) > limit:
+            batches.append(batch)
+            batch = []
+        batch.append(member)
+    if batch:
+        batches.append(batch)
+    return batches
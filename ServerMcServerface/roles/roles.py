@@ -1,4 +1,7 @@
+import asyncio
+
 from redbot.core import commands
+from .logsink import LogSink
 
 # TODO: Create tool where a role can be assigned to a reaction emoji from bot commands
 
@@ -8,7 +11,6 @@ class RoleManager(commands.Cog):
 
     guild_id = 493875452046475275
     log_id = 509041710651670548
-    log_channel = None
     roles = {
         "member": {"id": 567886671245475869, "msg_id": 508393348067885066, "emoji": '👍'},
         "reader": {"id": 506657944860098561, "msg_id": 569318277612961822, "emoji": '📖'},
@@ -19,9 +21,18 @@ class RoleManager(commands.Cog):
         "artist": {"id": 578703388263317565, "msg_id": 569318277612961822, "emoji": '🖌️'}
     }
 
+    # variation selectors and skin tone modifiers, which Discord may or may not send with an emoji
+    emoji_modifiers = frozenset([0xFE0E, 0xFE0F, *range(0x1F3FB, 0x1F400)])
+
     def __init__(self, bot):
         self.bot = bot
-        pass
+        # (message id, normalized emoji) -> (role name, role properties)
+        self.role_index = self.build_role_index()
+        # role changes come in bursts, so their log lines are posted a few at a time
+        self.log_sink = LogSink(lambda: self.bot.get_channel(self.log_id))
+
+    def cog_unload(self):
+        asyncio.create_task(self.log_sink.close())
 
     def get_guild(self):
         """Gets a discord guild reference
@@ -56,27 +67,35 @@ class RoleManager(commands.Cog):
         return self.get_guild().get_member(id)
 
     async def log(self, msg):
-        """Logs a message to the guild channel set up for logging
+        """Queues a message for the guild channel set up for logging
 
         Args:
             msg (str): the message to be sent
         """
-        if not self.log_channel:
-            self.log_channel = self.bot.get_channel(self.log_id)
-        await self.log_channel.send(msg)
-        pass
+        self.log_sink.write(msg)
+
+    def normalize_emoji(self, emoji):
+        """Strips the characters that can differ between two sendings of the same emoji
+
+        Args:
+            emoji (str or PartialEmoji): The emoji to normalize
+        """
+        return "".join(char for char in str(emoji) if ord(char) not in self.emoji_modifiers)
+
+    def build_role_index(self):
+        """Maps every watched message and emoji pair to the role it grants"""
+        return {
+            (value["msg_id"], self.normalize_emoji(value["emoji"])): (key, value)
+            for (key, value) in self.roles.items()
+        }
 
     def determine_role(self, reaction):
-        """Searches the roles dictionary for a role that fits this reaction
+        """Looks up the role that fits this reaction
 
         Args:
             reaction (RawReactionActionEvent): The reaction from the server
         """
-        for (key, value) in self.roles.items():
-            # value is a role property, key is the name of the role
-            if (value["msg_id"] == reaction.message_id and value["emoji"] == str(reaction.emoji)):
-                return (key, value)
-        return (None, None)
+        return self.role_index.get((reaction.message_id, self.normalize_emoji(reaction.emoji)), (None, None))
 
     @commands.Cog.listener("on_raw_reaction_add")
     @commands.Cog.listener("on_raw_reaction_remove")
@@ -88,16 +107,16 @@ class RoleManager(commands.Cog):
             reaction (RawReactionActionEvent): The reaction sent from the server
             add (bool): If True, adds a role to the user. Otherwise, removes a role from the user
         """
-        member = self.get_member(reaction.user_id)
-
-        if member is None:
-            return print("Member wasn't found in guild")
         # does this reaction come from a message that we are monitoring?
-
         (role_name, role) = self.determine_role(reaction)
 
         if role is None:
-            return print("No role matched for this message and emoji")
+            return
+
+        member = self.get_member(reaction.user_id)
+
+        if member is None:
+            return print("Member wasn't found in guild")
 
         role_obj = self.get_role(role["id"])
         if reaction.event_type == "REACTION_ADD":